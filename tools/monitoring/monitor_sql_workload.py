@@ -15,7 +15,8 @@ Usage:
     python monitor_sql_workload.py --server SERVER --database DB --interval 120 --duration 86400
 
 Output:
-    - JSON file with time-series metrics
+    - JSON file with time-series metrics (streamed to a .ndjson log while running);
+      this file is the authoritative record, only recent summaries stay in memory
     - CSV file for Excel analysis
     - Console real-time monitoring
 
@@ -25,18 +26,41 @@ Date: 2025-11-25
 """
 
 import pyodbc
+import asyncio
 import time
 import json
 import csv
 import argparse
 import sys
-from datetime import datetime
+import queue
+import re
+import threading
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+from typing import NamedTuple
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import aioodbc
+except ImportError:
+    aioodbc = None
+
+def _decimal_to_float(value):
+    """pyodbc output converter: raw DECIMAL/NUMERIC text to float"""
+    return float(value) if value is not None else None
+
+
 class SQLServerMonitor:
     """Monitor SQL Server performance metrics"""
     
-    def __init__(self, server, database, username=None, password=None, trusted_connection=True):
+    def __init__(self, server, database, username=None, password=None, trusted_connection=True,
+                 legacy_cpu=False, include_system_dbs=False):
         """
         Initialize SQL Server connection
         
@@ -46,6 +70,8 @@ class SQLServerMonitor:
             username: SQL authentication username (optional)
             password: SQL authentication password (optional)
             trusted_connection: Use Windows authentication (default: True)
+            legacy_cpu: Derive CPU % from wait stats instead of the scheduler ring buffer
+            include_system_dbs: Report file stats and sizes for every database on the instance
         """
         self.server = server
         self.database = database
@@ -53,221 +79,712 @@ class SQLServerMonitor:
         self.password = password
         self.trusted_connection = trusted_connection
         self.connection = None
+        self._cursor = None
+        
+        self._snapshot_queries = self.SNAPSHOT_QUERIES
+        if legacy_cpu:
+            self._snapshot_queries = tuple(
+                ('cpu', (self.LEGACY_CPU_QUERY,)) if section == 'cpu' else (section, statements)
+                for section, statements in self.SNAPSHOT_QUERIES
+            )
+        
+        # File stats and sizes are scoped to the monitored database, resolved
+        # server-side from a bound parameter; master (or --include-system-dbs)
+        # widens the scope to the whole instance
+        if include_system_dbs:
+            io_database_id, min_database_id, self._snapshot_params = "NULL", 0, ()
+        elif database.lower() == 'master':
+            io_database_id, min_database_id, self._snapshot_params = "NULL", 4, ()
+        else:
+            io_database_id, min_database_id, self._snapshot_params = "DB_ID(?)", 0, (database,)
+        
+        # All snapshot statements combined into one batch, built once
+        self._batch_header = (
+            "SET NOCOUNT ON;\n"
+            f"DECLARE @io_database_id INT = {io_database_id};\n"
+            f"DECLARE @min_database_id INT = {min_database_id};\n"
+        )
+        
+        # Statements that return nothing on this instance are dropped at connect
+        self._active_queries = self._snapshot_queries
+        self._enabled = {section: True for section, _ in self._snapshot_queries}
+        self._build_batches()
+        self._db_sizes_cache = (0.0, None)
+        self._total_ram_kb = None
+        self._last_snapshot = None
+        self._columns = {}
+        
+        # Raw cumulative values from the previous sample, used to compute deltas
+        self._prev_io = {}
+        self._prev_counters = None
+        self._prev_snapshot_time = None
+        
+    @staticmethod
+    def _detect_driver():
+        """Return the newest installed 'ODBC Driver NN for SQL Server'"""
+        versions = []
+        for driver in pyodbc.drivers():
+            match = re.fullmatch(r'ODBC Driver (\d+) for SQL Server', driver)
+            if match:
+                versions.append((int(match.group(1)), driver))
+        return max(versions)[1] if versions else 'ODBC Driver 17 for SQL Server'
+    
+    def _connection_string(self):
+        """
+        Build the ODBC connection string
+        
+        Besides picking the newest driver, this enables TLS (trusting the
+        server certificate, as most on-premises instances use self-signed
+        ones), MARS, and the maximum TDS packet size. Packet Size is the
+        biggest single knob for transferring the DMV result sets: 32767 bytes
+        instead of the default 4096 means far fewer network packets per sample.
+        """
+        attributes = {
+            'DRIVER': '{' + self._detect_driver() + '}',
+            'SERVER': self.server,
+            'DATABASE': self.database,
+            'Encrypt': 'yes',
+            'TrustServerCertificate': 'yes',
+            'MARS_Connection': 'yes',
+            'Packet Size': '32767',
+        }
+        if self.trusted_connection:
+            attributes['Trusted_Connection'] = 'yes'
+        else:
+            attributes['UID'] = self.username
+            attributes['PWD'] = self.password
+        return ';'.join(f"{key}={value}" for key, value in attributes.items()) + ';'
+    
+    def _build_batch(self, queries):
+        """Combine the statements of the given snapshot sections into one batch"""
+        return self._batch_header + ";\n".join(
+            statement.strip()
+            for _, statements in queries
+            for statement in statements
+        ) + ";"
+    
+    def _build_batches(self):
+        """(Re)build the per-sample batches from the active snapshot statements"""
+        # Database sizes only change on autogrow, so they are re-read at most
+        # every DATABASE_SIZES_TTL seconds; the batch without them is kept too
+        self._snapshot_variants = {
+            True: self._active_queries,
+            False: tuple(query for query in self._active_queries if query[0] != 'database_sizes'),
+        }
+        self._snapshot_batches = {
+            with_sizes: (queries, self._build_batch(queries))
+            for with_sizes, queries in self._snapshot_variants.items()
+        }
+    
+    def _probe_batches(self):
+        """Yield ((section, index), SQL) to probe each snapshot statement on its own"""
+        for section, statements in self._snapshot_queries:
+            for index, statement in enumerate(statements):
+                yield (section, index), self._build_batch(((section, (statement,)),))
+    
+    def _apply_probe(self, returned_rows):
+        """
+        Keep only the snapshot statements that returned rows when probed
+        
+        Not every instance exposes every DMV or counter (e.g. sys.dm_os_sys_memory
+        on Azure SQL Database), so empty or failing statements are skipped for
+        the rest of the session instead of costing a round trip every sample.
+        
+        Args:
+            returned_rows: Set of (section, index) keys whose probe returned rows
+        """
+        active = []
+        partial = []
+        for section, statements in self._snapshot_queries:
+            kept = tuple(statement for index, statement in enumerate(statements)
+                         if (section, index) in returned_rows)
+            self._enabled[section] = bool(kept)
+            if kept:
+                active.append((section, kept))
+                if len(kept) < len(statements):
+                    partial.append(section)
+        
+        self._active_queries = tuple(active)
+        self._build_batches()
         
+        disabled = [section for section, enabled in self._enabled.items() if not enabled]
+        if disabled:
+            print(f"⚠️  No data on this instance, skipping: {', '.join(disabled)}")
+        if partial:
+            print(f"⚠️  Partially available, some statements skipped: {', '.join(partial)}")
+    
+    def _probe_sections(self):
+        """Run every snapshot statement once and disable the ones that return nothing"""
+        returned_rows = set()
+        for key, sql in self._probe_batches():
+            try:
+                self._cursor.execute(sql, *self._snapshot_params)
+                if self._cursor.fetchall():
+                    returned_rows.add(key)
+            except pyodbc.Error:
+                pass
+        self.connection.rollback()
+        self._apply_probe(returned_rows)
+    
+    # Session-scoped lookup of benign waits, loaded once per connection and
+    # joined by the wait stats query
+    IGNORED_WAITS_SETUP = (
+        "CREATE TABLE #ignored_waits (wait_type NVARCHAR(120) PRIMARY KEY)",
+        "INSERT INTO #ignored_waits (wait_type) VALUES {}",
+    )
+    
     def connect(self):
         """Establish connection to SQL Server"""
         try:
-            if self.trusted_connection:
-                connection_string = (
-                    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                    f"SERVER={self.server};"
-                    f"DATABASE={self.database};"
-                    f"Trusted_Connection=yes;"
-                )
-            else:
-                connection_string = (
-                    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                    f"SERVER={self.server};"
-                    f"DATABASE={self.database};"
-                    f"UID={self.username};"
-                    f"PWD={self.password};"
-                )
+            self.connection = pyodbc.connect(self._connection_string(), timeout=30)
+            
+            # Return DECIMAL/NUMERIC columns as float instead of decimal.Decimal
+            for sql_type in (pyodbc.SQL_DECIMAL, pyodbc.SQL_NUMERIC):
+                self.connection.add_output_converter(sql_type, _decimal_to_float)
             
-            self.connection = pyodbc.connect(connection_string, timeout=30)
+            # Long-lived cursor: re-executing the same SQL on the same cursor lets
+            # the driver reuse its statement handle instead of re-preparing it
+            self._cursor = self.connection.cursor()
+            
+            create_sql, insert_sql = self.IGNORED_WAITS_SETUP
+            self._cursor.execute(create_sql)
+            self._cursor.execute(insert_sql.format(", ".join("(?)" for _ in self.IGNORED_WAIT_TYPES)),
+                                 *self.IGNORED_WAIT_TYPES)
+            # Do not leave the setup transaction open for the whole run
+            self.connection.commit()
+            
+            # Physical RAM does not change while the instance is up
+            try:
+                self._total_ram_kb = self._cursor.execute(self.TOTAL_RAM_QUERY).fetchone()[0]
+            except pyodbc.Error:
+                self._total_ram_kb = None
             print(f"✅ Connected to SQL Server: {self.server}")
+            
+            self._probe_sections()
             return True
             
         except Exception as e:
             print(f"❌ Connection failed: {str(e)}")
             return False
     
-    def execute_query(self, query):
-        """Execute SQL query and return results"""
+    # Snapshot queries, grouped by output section. Every statement is sent to
+    # the server in a single batch per sample; sections with more than one
+    # statement are merged into a single row.
+    SNAPSHOT_QUERIES = (
+        ('cpu', (
+            """
+            SELECT TOP 1
+                CAST(rb.record.value('(./Record/SchedulerMonitorEvent/SystemHealth/ProcessUtilization)[1]', 'int') AS DECIMAL(5,2)) AS cpu_usage_pct,
+                rb.record.value('(./Record/SchedulerMonitorEvent/SystemHealth/SystemIdle)[1]', 'int') AS system_idle_pct,
+                CAST(@@CPU_BUSY / (@@TIMETICKS / 1000.0) AS DECIMAL(10,2)) AS sql_cpu_time_ms
+            FROM (
+                SELECT timestamp, CONVERT(XML, record) AS record
+                FROM sys.dm_os_ring_buffers
+                WHERE ring_buffer_type = N'RING_BUFFER_SCHEDULER_MONITOR'
+                AND record LIKE N'%<SystemHealth>%'
+            ) AS rb
+            ORDER BY rb.timestamp DESC
+            """,
+        )),
+        ('memory', (
+            """
+            SELECT 
+                available_physical_memory_kb,
+                (system_memory_state_desc) AS memory_state
+            FROM sys.dm_os_sys_memory
+            """,
+            """
+            SELECT 
+                (cntr_value / 1024) AS buffer_pool_mb
+            FROM sys.dm_os_performance_counters
+            WHERE counter_name = 'Database Cache Memory (KB)'
+            """,
+            """
+            SELECT 
+                cntr_value AS page_life_expectancy_sec
+            FROM sys.dm_os_performance_counters
+            WHERE counter_name = 'Page life expectancy'
+            AND object_name LIKE '%Buffer Manager%'
+            """,
+        )),
+        ('disk_io', (
+            """
+            SELECT 
+                database_id,
+                DB_NAME(database_id) AS database_name,
+                SUM(num_of_reads) AS num_of_reads,
+                SUM(num_of_writes) AS num_of_writes,
+                SUM(num_of_bytes_read) AS num_of_bytes_read,
+                SUM(num_of_bytes_written) AS num_of_bytes_written,
+                SUM(io_stall_read_ms) AS io_stall_read_ms,
+                SUM(io_stall_write_ms) AS io_stall_write_ms
+            FROM sys.dm_io_virtual_file_stats(@io_database_id, NULL)
+            WHERE database_id > @min_database_id
+            GROUP BY database_id
+            """,
+        )),
+        ('transactions', (
+            """
+            SELECT 
+                cntr_value AS transactions_per_sec
+            FROM sys.dm_os_performance_counters
+            WHERE counter_name = 'Transactions/sec'
+            AND instance_name = '_Total'
+            """,
+            """
+            SELECT 
+                cntr_value AS batch_requests_per_sec
+            FROM sys.dm_os_performance_counters
+            WHERE counter_name = 'Batch Requests/sec'
+            """,
+            """
+            SELECT 
+                cntr_value AS sql_compilations_per_sec
+            FROM sys.dm_os_performance_counters
+            WHERE counter_name = 'SQL Compilations/sec'
+            """,
+        )),
+        ('wait_stats', (
+            """
+            SELECT TOP 10
+                wait_type,
+                waiting_tasks_count,
+                CAST(wait_time_ms / 1000.0 AS DECIMAL(10,2)) AS wait_time_sec,
+                CAST(max_wait_time_ms / 1000.0 AS DECIMAL(10,2)) AS max_wait_time_sec,
+                CAST(signal_wait_time_ms / 1000.0 AS DECIMAL(10,2)) AS signal_wait_time_sec
+            FROM sys.dm_os_wait_stats AS s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM #ignored_waits AS i WHERE i.wait_type = s.wait_type
+            )
+            AND wait_time_ms > 0
+            ORDER BY wait_time_ms DESC
+            """,
+        )),
+        ('database_sizes', (
+            """
+            SELECT 
+                DB_NAME(database_id) AS database_name,
+                CAST(SUM(size) * 8.0 / 1024 AS DECIMAL(10,2)) AS size_mb,
+                type_desc AS file_type
+            FROM sys.master_files
+            WHERE (@io_database_id IS NULL OR database_id = @io_database_id)
+            AND database_id > @min_database_id
+            GROUP BY database_id, type_desc
+            """,
+        )),
+    )
+    
+    # Read once on connect; RAM totals are derived in Python from this
+    TOTAL_RAM_QUERY = "SELECT total_physical_memory_kb FROM sys.dm_os_sys_memory"
+    
+    # Seconds a database_sizes result is reused before sys.master_files is read again
+    DATABASE_SIZES_TTL = 300
+    
+    # Sections read as cumulative totals and only published as per-interval deltas
+    CUMULATIVE_SECTIONS = ('disk_io', 'transactions')
+    
+    # Idle/background waits excluded from the top waits (loaded into #ignored_waits)
+    IGNORED_WAIT_TYPES = (
+        'CLR_SEMAPHORE', 'LAZYWRITER_SLEEP', 'RESOURCE_QUEUE', 'SLEEP_TASK',
+        'SLEEP_SYSTEMTASK', 'SQLTRACE_BUFFER_FLUSH', 'WAITFOR', 'LOGMGR_QUEUE',
+        'CHECKPOINT_QUEUE', 'REQUEST_FOR_DEADLOCK_SEARCH', 'XE_TIMER_EVENT',
+        'BROKER_TO_FLUSH', 'BROKER_TASK_STOP', 'CLR_MANUAL_EVENT',
+        'CLR_AUTO_EVENT', 'DISPATCHER_QUEUE_SEMAPHORE', 'FT_IFTS_SCHEDULER_IDLE_WAIT',
+        'XE_DISPATCHER_WAIT', 'XE_DISPATCHER_JOIN', 'SQLTRACE_INCREMENTAL_FLUSH_SLEEP',
+    )
+    
+    # Signal-wait ratio over the whole wait stats DMV (--legacy-cpu)
+    LEGACY_CPU_QUERY = """
+            SELECT 
+                CAST(100.0 * SUM(signal_wait_time_ms) / SUM(wait_time_ms) AS DECIMAL(5,2)) AS cpu_usage_pct,
+                CAST(@@CPU_BUSY / (@@TIMETICKS / 1000.0) AS DECIMAL(10,2)) AS sql_cpu_time_ms
+            FROM sys.dm_os_wait_stats
+            WHERE wait_time_ms > 0
+            """
+    
+    def _fetch_result_set(self, cursor, key=None):
+        """
+        Convert the current result set of a cursor to a list of dictionaries
+        
+        Args:
+            cursor: Cursor positioned on the result set to read
+            key: Optional cache key; column names are resolved once per key
+        """
+        columns = self._columns.get(key) if key is not None else None
+        if columns is None:
+            columns = tuple(column[0] for column in cursor.description)
+            if key is not None:
+                self._columns[key] = columns
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    def get_all_metrics(self):
+        """
+        Run all snapshot queries in a single round trip
+        
+        Returns:
+            Dict keyed by section name ('cpu', 'memory', ...) with a list of rows each
+        """
+        snapshot = {section: [] for section, _ in self._snapshot_queries}
+        with_sizes = self._database_sizes_due()
+        queries, sql = self._snapshot_batches[with_sizes]
+        
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query)
-            
-            # Get column names
-            columns = [column[0] for column in cursor.description]
+            cursor = self._cursor
+            cursor.execute(sql, *self._snapshot_params)
+            now = time.monotonic()
             
-            # Fetch all rows
-            rows = cursor.fetchall()
+            first = True
+            for section, statements in queries:
+                result_sets = []
+                for index in range(len(statements)):
+                    if not first:
+                        cursor.nextset()
+                    first = False
+                    result_sets.append(self._fetch_result_set(cursor, (section, index)))
+                self._store_section(snapshot, section, result_sets)
             
-            # Convert to list of dictionaries
-            results = []
-            for row in rows:
-                results.append(dict(zip(columns, row)))
-            
-            cursor.close()
-            return results
+            self._finish_snapshot(snapshot, now, with_sizes)
             
         except Exception as e:
             print(f"⚠️  Query error: {str(e)}")
-            return []
+            self._drop_cumulative_sections(snapshot)
+        
+        self._last_snapshot = snapshot
+        return snapshot
+    
+    @staticmethod
+    def _store_section(snapshot, section, result_sets):
+        """Store the result sets of one section, merging multi-statement sections"""
+        if len(result_sets) == 1:
+            snapshot[section] = result_sets[0]
+        else:
+            # Consolidate single-row results into one record
+            merged = {}
+            for rows in result_sets:
+                if rows:
+                    merged.update(rows[0])
+            snapshot[section] = [merged] if merged else []
+    
+    def _database_sizes_due(self):
+        """True when the cached database sizes are missing or older than the TTL"""
+        cached_at, sizes = self._db_sizes_cache
+        return sizes is None or time.monotonic() - cached_at >= self.DATABASE_SIZES_TTL
+    
+    def _finish_snapshot(self, snapshot, now, with_sizes):
+        """Derive memory totals, apply the sizes cache and per-interval deltas"""
+        if snapshot['memory']:
+            snapshot['memory'] = [self._memory_row(snapshot['memory'][0])]
+        
+        if with_sizes:
+            self._db_sizes_cache = (now, snapshot['database_sizes'])
+        else:
+            snapshot['database_sizes'] = self._db_sizes_cache[1]
+        
+        # File stats and '/sec' counters are cumulative since startup
+        elapsed = now - self._prev_snapshot_time if self._prev_snapshot_time else 0
+        snapshot['disk_io'] = self._disk_io_deltas(snapshot['disk_io'], elapsed)
+        snapshot['transactions'] = self._counter_rates(snapshot['transactions'], elapsed)
+        self._prev_snapshot_time = now
+    
+    def _drop_cumulative_sections(self, snapshot):
+        """
+        Blank the cumulative sections of a snapshot whose deltas were not computed
+        
+        A batch that fails part-way skips _finish_snapshot, so these sections
+        would still hold raw totals since startup.
+        """
+        for section in self.CUMULATIVE_SECTIONS:
+            snapshot[section] = []
+    
+    def _memory_row(self, row):
+        """Expand the polled memory row with totals based on the RAM read at connect"""
+        if 'available_physical_memory_kb' not in row:
+            return row
+        total_kb = self._total_ram_kb or 0
+        available_kb = row.pop('available_physical_memory_kb', 0) or 0
+        return {
+            'total_ram_mb': total_kb // 1024,
+            'available_ram_mb': available_kb // 1024,
+            'used_ram_mb': (total_kb - available_kb) // 1024,
+            'ram_usage_pct': round(100.0 * (total_kb - available_kb) / total_kb, 2) if total_kb else 0,
+            **row
+        }
+    
+    def _disk_io_deltas(self, rows, elapsed):
+        """
+        Convert cumulative file stats into per-interval values
+        
+        The first sample only establishes the baseline and reports zeros.
+        
+        Args:
+            rows: Raw rows from sys.dm_io_virtual_file_stats, one per database
+            elapsed: Seconds since the previous sample
+        """
+        results = []
+        current = {}
+        
+        for row in rows:
+            current[row['database_id']] = row
+            prev = self._prev_io.get(row['database_id'], row)
+            
+            reads = row['num_of_reads'] - prev['num_of_reads']
+            writes = row['num_of_writes'] - prev['num_of_writes']
+            read_stall = row['io_stall_read_ms'] - prev['io_stall_read_ms']
+            write_stall = row['io_stall_write_ms'] - prev['io_stall_write_ms']
+            
+            results.append({
+                'database_name': row['database_name'],
+                'total_reads': reads,
+                'total_writes': writes,
+                'total_iops': round((reads + writes) / elapsed, 2) if elapsed else 0,
+                'total_mb_read': round((row['num_of_bytes_read'] - prev['num_of_bytes_read']) / 1048576, 2),
+                'total_mb_written': round((row['num_of_bytes_written'] - prev['num_of_bytes_written']) / 1048576, 2),
+                'total_read_latency_ms': read_stall,
+                'total_write_latency_ms': write_stall,
+                'avg_read_latency_ms': round(read_stall / reads, 2) if reads else 0,
+                'avg_write_latency_ms': round(write_stall / writes, 2) if writes else 0
+            })
+        
+        self._prev_io = current
+        return results
+    
+    def _counter_rates(self, rows, elapsed):
+        """
+        Convert cumulative '/sec' performance counters into per-second rates
+        
+        Args:
+            rows: Consolidated transaction counters row (list of one dict)
+            elapsed: Seconds since the previous sample
+        """
+        if not rows:
+            return rows
+        
+        current = rows[0]
+        prev = self._prev_counters or current
+        self._prev_counters = current
+        
+        return [{
+            key: round((value - prev[key]) / elapsed, 2) if elapsed and key in prev else 0
+            for key, value in current.items()
+        }]
+    
+    def _snapshot_section(self, section):
+        """Return one section of the last snapshot, collecting one if needed"""
+        if self._last_snapshot is None:
+            self.get_all_metrics()
+        return self._last_snapshot[section]
     
     def get_cpu_metrics(self):
         """Get CPU utilization metrics"""
-        query = """
-        SELECT 
-            CAST(100.0 * SUM(signal_wait_time_ms) / SUM(wait_time_ms) AS DECIMAL(5,2)) AS cpu_usage_pct,
-            CAST(@@CPU_BUSY / (@@TIMETICKS / 1000.0) AS DECIMAL(10,2)) AS sql_cpu_time_ms
-        FROM sys.dm_os_wait_stats
-        WHERE wait_time_ms > 0;
-        """
-        return self.execute_query(query)
+        return self._snapshot_section('cpu')
     
     def get_memory_metrics(self):
         """Get memory utilization metrics"""
-        query = """
-        SELECT 
-            (total_physical_memory_kb / 1024) AS total_ram_mb,
-            (available_physical_memory_kb / 1024) AS available_ram_mb,
-            (total_physical_memory_kb - available_physical_memory_kb) / 1024 AS used_ram_mb,
-            CAST(100.0 * (total_physical_memory_kb - available_physical_memory_kb) / total_physical_memory_kb AS DECIMAL(5,2)) AS ram_usage_pct,
-            (system_memory_state_desc) AS memory_state
-        FROM sys.dm_os_sys_memory;
-        
-        SELECT 
-            (cntr_value / 1024) AS buffer_pool_mb
-        FROM sys.dm_os_performance_counters
-        WHERE counter_name = 'Database Cache Memory (KB)';
-        
-        SELECT 
-            cntr_value AS page_life_expectancy_sec
-        FROM sys.dm_os_performance_counters
-        WHERE counter_name = 'Page life expectancy'
-        AND object_name LIKE '%Buffer Manager%';
-        """
-        results = self.execute_query(query)
-        
-        # Consolidate results
-        if results and len(results) >= 3:
-            memory_info = results[0]
-            memory_info['buffer_pool_mb'] = results[1]['buffer_pool_mb'] if len(results) > 1 else 0
-            memory_info['page_life_expectancy_sec'] = results[2]['page_life_expectancy_sec'] if len(results) > 2 else 0
-            return [memory_info]
-        return results
+        return self._snapshot_section('memory')
     
     def get_disk_io_metrics(self):
         """Get disk I/O metrics"""
-        query = """
-        SELECT 
-            DB_NAME(database_id) AS database_name,
-            SUM(num_of_reads) AS total_reads,
-            SUM(num_of_writes) AS total_writes,
-            SUM(num_of_reads + num_of_writes) AS total_iops,
-            SUM(num_of_bytes_read) / 1048576 AS total_mb_read,
-            SUM(num_of_bytes_written) / 1048576 AS total_mb_written,
-            CAST(SUM(io_stall_read_ms) AS DECIMAL(10,2)) AS total_read_latency_ms,
-            CAST(SUM(io_stall_write_ms) AS DECIMAL(10,2)) AS total_write_latency_ms,
-            CASE 
-                WHEN SUM(num_of_reads) > 0 THEN CAST(SUM(io_stall_read_ms) / SUM(num_of_reads) AS DECIMAL(10,2))
-                ELSE 0 
-            END AS avg_read_latency_ms,
-            CASE 
-                WHEN SUM(num_of_writes) > 0 THEN CAST(SUM(io_stall_write_ms) / SUM(num_of_writes) AS DECIMAL(10,2))
-                ELSE 0 
-            END AS avg_write_latency_ms
-        FROM sys.dm_io_virtual_file_stats(NULL, NULL)
-        WHERE database_id > 4  -- Exclude system databases
-        GROUP BY database_id;
-        """
-        return self.execute_query(query)
+        return self._snapshot_section('disk_io')
     
     def get_transaction_metrics(self):
         """Get transaction and batch request metrics"""
-        query = """
-        SELECT 
-            cntr_value AS transactions_per_sec
-        FROM sys.dm_os_performance_counters
-        WHERE counter_name = 'Transactions/sec'
-        AND instance_name = '_Total';
-        
-        SELECT 
-            cntr_value AS batch_requests_per_sec
-        FROM sys.dm_os_performance_counters
-        WHERE counter_name = 'Batch Requests/sec';
-        
-        SELECT 
-            cntr_value AS sql_compilations_per_sec
-        FROM sys.dm_os_performance_counters
-        WHERE counter_name = 'SQL Compilations/sec';
-        """
-        results = self.execute_query(query)
-        
-        # Consolidate results
-        if results and len(results) >= 3:
-            txn_info = {
-                'transactions_per_sec': results[0]['transactions_per_sec'] if results else 0,
-                'batch_requests_per_sec': results[1]['batch_requests_per_sec'] if len(results) > 1 else 0,
-                'sql_compilations_per_sec': results[2]['sql_compilations_per_sec'] if len(results) > 2 else 0
-            }
-            return [txn_info]
-        return results
+        return self._snapshot_section('transactions')
     
     def get_wait_statistics(self):
         """Get top wait statistics"""
-        query = """
-        SELECT TOP 10
-            wait_type,
-            waiting_tasks_count,
-            CAST(wait_time_ms / 1000.0 AS DECIMAL(10,2)) AS wait_time_sec,
-            CAST(max_wait_time_ms / 1000.0 AS DECIMAL(10,2)) AS max_wait_time_sec,
-            CAST(signal_wait_time_ms / 1000.0 AS DECIMAL(10,2)) AS signal_wait_time_sec
-        FROM sys.dm_os_wait_stats
-        WHERE wait_type NOT IN (
-            'CLR_SEMAPHORE', 'LAZYWRITER_SLEEP', 'RESOURCE_QUEUE', 'SLEEP_TASK',
-            'SLEEP_SYSTEMTASK', 'SQLTRACE_BUFFER_FLUSH', 'WAITFOR', 'LOGMGR_QUEUE',
-            'CHECKPOINT_QUEUE', 'REQUEST_FOR_DEADLOCK_SEARCH', 'XE_TIMER_EVENT',
-            'BROKER_TO_FLUSH', 'BROKER_TASK_STOP', 'CLR_MANUAL_EVENT',
-            'CLR_AUTO_EVENT', 'DISPATCHER_QUEUE_SEMAPHORE', 'FT_IFTS_SCHEDULER_IDLE_WAIT',
-            'XE_DISPATCHER_WAIT', 'XE_DISPATCHER_JOIN', 'SQLTRACE_INCREMENTAL_FLUSH_SLEEP'
-        )
-        AND wait_time_ms > 0
-        ORDER BY wait_time_ms DESC;
-        """
-        return self.execute_query(query)
+        return self._snapshot_section('wait_stats')
     
     def get_database_sizes(self):
         """Get database sizes and growth"""
-        query = """
-        SELECT 
-            DB_NAME(database_id) AS database_name,
-            CAST(SUM(size) * 8.0 / 1024 AS DECIMAL(10,2)) AS size_mb,
-            type_desc AS file_type
-        FROM sys.master_files
-        WHERE database_id > 4  -- Exclude system databases
-        GROUP BY database_id, type_desc;
-        """
-        return self.execute_query(query)
+        return self._snapshot_section('database_sizes')
     
     def collect_metrics(self):
-        """Collect all metrics in a single snapshot"""
+        """
+        Collect all metrics in a single snapshot
+        
+        Returns:
+            Tuple of (raw metrics dict for the JSON archive, Sample summary)
+        """
         timestamp = datetime.now().isoformat()
         
+        snapshot = self.get_all_metrics()
+        
         metrics = {
             'timestamp': timestamp,
             'server': self.server,
             'database': self.database,
-            'cpu': self.get_cpu_metrics(),
-            'memory': self.get_memory_metrics(),
-            'disk_io': self.get_disk_io_metrics(),
-            'transactions': self.get_transaction_metrics(),
-            'wait_stats': self.get_wait_statistics(),
-            'database_sizes': self.get_database_sizes()
+            'cpu': snapshot['cpu'],
+            'memory': snapshot['memory'],
+            'disk_io': snapshot['disk_io'],
+            'transactions': snapshot['transactions'],
+            'wait_stats': snapshot['wait_stats'],
+            'database_sizes': snapshot['database_sizes']
         }
+        sample = summarize_metrics(metrics)
+        metrics['summary'] = sample._asdict()
         
-        return metrics
+        return metrics, sample
     
     def close(self):
         """Close database connection"""
+        if self._cursor:
+            self._cursor.close()
+            self._cursor = None
         if self.connection:
             self.connection.close()
             print("✅ Connection closed")
 
 
+class AsyncSQLServerMonitor(SQLServerMonitor):
+    """
+    SQL Server monitor that overlaps query round trips (--async)
+    
+    The snapshot sections are split across several aioodbc connections and
+    their batches run concurrently, so a sample costs roughly the slowest
+    batch instead of the sum of all of them. Requires the aioodbc package.
+    """
+    
+    def __init__(self, *args, connections=3, **kwargs):
+        self._connection_count = connections
+        super().__init__(*args, **kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._connections = []
+        self._cursors = []
+    
+    def _build_batches(self):
+        super()._build_batches()
+        
+        # Round-robin the sections over the connections, one batch each
+        n = self._connection_count
+        self._batches = {}
+        for with_sizes, queries in self._snapshot_variants.items():
+            groups = [queries[i::n] for i in range(n)]
+            self._batches[with_sizes] = [(group, self._build_batch(group)) for group in groups if group]
+    
+    def connect(self):
+        """Open one aioodbc connection per snapshot batch"""
+        try:
+            self._loop.run_until_complete(self._connect())
+            print(f"✅ Connected to SQL Server: {self.server} "
+                  f"({len(self._connections)} async connections)")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Connection failed: {str(e)}")
+            # No close() follows a failed connect: release what was opened
+            try:
+                self._loop.run_until_complete(self._close())
+            except Exception:
+                pass
+            self._loop.close()
+            return False
+    
+    async def _connect(self):
+        connection_string = self._connection_string()
+        create_sql, insert_sql = self.IGNORED_WAITS_SETUP
+        insert_sql = insert_sql.format(", ".join("(?)" for _ in self.IGNORED_WAIT_TYPES))
+        
+        for _ in self._batches[True]:
+            connection = await aioodbc.connect(dsn=connection_string, timeout=30)
+            self._connections.append(connection)
+            for sql_type in (pyodbc.SQL_DECIMAL, pyodbc.SQL_NUMERIC):
+                await connection.add_output_converter(sql_type, _decimal_to_float)
+            
+            cursor = await connection.cursor()
+            self._cursors.append(cursor)
+            await cursor.execute(create_sql)
+            await cursor.execute(insert_sql, *self.IGNORED_WAIT_TYPES)
+            await connection.commit()
+        
+        cursor = self._cursors[0]
+        try:
+            await cursor.execute(self.TOTAL_RAM_QUERY)
+            self._total_ram_kb = (await cursor.fetchone())[0]
+        except pyodbc.Error:
+            self._total_ram_kb = None
+        
+        returned_rows = set()
+        for key, sql in self._probe_batches():
+            try:
+                await cursor.execute(sql, *self._snapshot_params)
+                if await cursor.fetchall():
+                    returned_rows.add(key)
+            except pyodbc.Error:
+                pass
+        await self._connections[0].rollback()
+        self._apply_probe(returned_rows)
+    
+    def get_all_metrics(self):
+        """
+        Run the snapshot batches concurrently, one per connection
+        
+        Returns:
+            Dict keyed by section name ('cpu', 'memory', ...) with a list of rows each
+        """
+        snapshot = {section: [] for section, _ in self._snapshot_queries}
+        with_sizes = self._database_sizes_due()
+        
+        try:
+            self._loop.run_until_complete(self._run_batches(snapshot, self._batches[with_sizes]))
+            self._finish_snapshot(snapshot, time.monotonic(), with_sizes)
+            
+        except Exception as e:
+            print(f"⚠️  Query error: {str(e)}")
+            self._drop_cumulative_sections(snapshot)
+        
+        self._last_snapshot = snapshot
+        return snapshot
+    
+    async def _run_batches(self, snapshot, batches):
+        """Run the batches concurrently; raise the first error once all have finished"""
+        # Waiting for every batch keeps a failed sibling from still using its
+        # long-lived cursor when the next snapshot starts
+        results = await asyncio.gather(*(
+            self._run_batch(cursor, queries, sql, snapshot)
+            for cursor, (queries, sql) in zip(self._cursors, batches)
+        ), return_exceptions=True)
+        
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+    
+    async def _run_batch(self, cursor, queries, sql, snapshot):
+        """Execute one batch and store its sections into the snapshot"""
+        await cursor.execute(sql, *self._snapshot_params)
+        
+        first = True
+        for section, statements in queries:
+            result_sets = []
+            for index in range(len(statements)):
+                if not first:
+                    await cursor.nextset()
+                first = False
+                key = (section, index)
+                columns = self._columns.get(key)
+                if columns is None:
+                    columns = self._columns[key] = tuple(column[0] for column in cursor.description)
+                result_sets.append([dict(zip(columns, row)) for row in await cursor.fetchall()])
+            self._store_section(snapshot, section, result_sets)
+    
+    def close(self):
+        """Close all connections and the event loop"""
+        if self._connections:
+            self._loop.run_until_complete(self._close())
+            print("✅ Connection closed")
+        self._loop.close()
+    
+    async def _close(self):
+        for cursor in self._cursors:
+            await cursor.close()
+        for connection in self._connections:
+            await connection.close()
+        self._cursors = []
+        self._connections = []
+
+
 def monitor_workload(server, database, username, password, trusted_connection, 
-                     interval, duration, output_file):
+                     interval, duration, output_file, legacy_cpu=False,
+                     include_system_dbs=False, quiet=False, use_async=False, strict_csv=False):
     """
     Main monitoring loop
     
@@ -280,6 +797,11 @@ def monitor_workload(server, database, username, password, trusted_connection,
         interval: Sampling interval in seconds
         duration: Total monitoring duration in seconds
         output_file: Output JSON filename
+        legacy_cpu: Use the wait-stats based CPU query
+        include_system_dbs: Include every database (system ones too) in I/O and size metrics
+        quiet: Suppress the per-sample console summary
+        use_async: Run the snapshot batches concurrently over aioodbc
+        strict_csv: Write CSV rows through the csv module instead of the fast formatter
     """
     print("\n" + "="*70)
     print("🔍 SQL SERVER WORKLOAD MONITOR - EXTENDED EDITION")
@@ -292,140 +814,301 @@ def monitor_workload(server, database, username, password, trusted_connection,
     print("="*70 + "\n")
     
     # Initialize monitor
-    monitor = SQLServerMonitor(server, database, username, password, trusted_connection)
+    monitor_class = SQLServerMonitor
+    if use_async:
+        if aioodbc is None:
+            print("⚠️  aioodbc is not installed - falling back to synchronous mode")
+        else:
+            monitor_class = AsyncSQLServerMonitor
+    monitor = monitor_class(server, database, username, password, trusted_connection,
+                            legacy_cpu=legacy_cpu, include_system_dbs=include_system_dbs)
     
     if not monitor.connect():
         print("❌ Failed to connect to SQL Server")
         sys.exit(1)
     
-    # Prepare output
-    all_metrics = []
-    start_time = time.time()
+    # Prepare output: a background thread streams samples to an NDJSON log
+    # and the CSV summary so disk I/O never delays the next sample; the log
+    # is wrapped into the JSON array at shutdown. The output files are the
+    # authoritative record; only the last RECENT_WINDOW summaries are kept in
+    # memory, for the console, so memory use does not grow with the run length
+    start_time = time.monotonic()
     sample_count = 0
+    recent = deque(maxlen=RECENT_WINDOW)
+    log_file = os.path.splitext(output_file)[0] + '.ndjson'
+    csv_file = output_file.replace('.json', '_summary.csv')
+    writer_q = queue.Queue()
+    writer = threading.Thread(target=_writer_loop, args=(writer_q, log_file, csv_file, strict_csv),
+                              daemon=True)
+    writer.start()
     
     try:
-        while (time.time() - start_time) < duration:
+        while sample_count * interval < duration:
             sample_count += 1
-            iteration_start = time.time()
-            
-            print(f"\n📊 Sample #{sample_count} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            sampled_at = datetime.now()
             
             # Collect metrics
-            metrics = monitor.collect_metrics()
-            all_metrics.append(metrics)
-            
-            # Display summary
-            if metrics['cpu']:
-                cpu_usage = metrics['cpu'][0].get('cpu_usage_pct', 0)
-                print(f"  CPU: {cpu_usage}%")
-            
-            if metrics['memory']:
-                ram_usage = metrics['memory'][0].get('ram_usage_pct', 0)
-                buffer_pool = metrics['memory'][0].get('buffer_pool_mb', 0)
-                print(f"  RAM: {ram_usage}% | Buffer Pool: {buffer_pool} MB")
-            
-            if metrics['disk_io']:
-                total_iops = sum(db.get('total_iops', 0) for db in metrics['disk_io'])
-                print(f"  IOPS: {total_iops}")
-            
-            if metrics['transactions']:
-                tps = metrics['transactions'][0].get('transactions_per_sec', 0)
-                print(f"  TPS: {tps}")
+            metrics, sample = monitor.collect_metrics()
+            metrics['elapsed_sec'] = round(time.monotonic() - start_time, 3)
+            writer_q.put((metrics, sample))
+            recent.append(sample)
             
-            # Save intermediate results every 10 samples
-            if sample_count % 10 == 0:
-                with open(output_file, 'w') as f:
-                    json.dump(all_metrics, f, indent=2, default=str)
-                print(f"  💾 Saved {sample_count} samples to {output_file}")
+            # Wait for the next absolute deadline so the schedule does not drift
+            next_deadline = start_time + sample_count * interval
+            sleep_time = next_deadline - time.monotonic()
+            will_sleep = sleep_time > 0 and sample_count * interval < duration
             
-            # Wait for next interval
-            elapsed = time.time() - iteration_start
-            sleep_time = max(0, interval - elapsed)
+            # Display summary as one write per sample
+            if not quiet:
+                msg = (
+                    f"\n📊 Sample #{sample_count} at {sampled_at:%Y-%m-%d %H:%M:%S}\n"
+                    f"  CPU: {sample.cpu_pct}%\n"
+                    f"  RAM: {sample.ram_pct}% | Buffer Pool: {sample.buffer_pool_mb} MB\n"
+                    f"  IOPS: {sample.total_iops}\n"
+                    f"  TPS: {sample.tps}\n"
+                )
+                if will_sleep:
+                    msg += f"  ⏱️  Waiting {sleep_time:.1f}s until next sample...\n"
+                sys.stdout.write(msg)
+                # Flushing every sample costs a syscall each time when stdout
+                # is redirected; a terminal is line-buffered regardless
+                if sample_count % CONSOLE_FLUSH_EVERY == 0:
+                    sys.stdout.flush()
             
-            if sleep_time > 0:
-                print(f"  ⏱️  Waiting {sleep_time:.1f}s until next sample...")
+            if will_sleep:
                 time.sleep(sleep_time)
         
         # Final save
-        with open(output_file, 'w') as f:
-            json.dump(all_metrics, f, indent=2, default=str)
-        
-        # Generate CSV summary
-        csv_file = output_file.replace('.json', '_summary.csv')
-        generate_csv_summary(all_metrics, csv_file)
+        _stop_writer(writer_q, writer)
+        ndjson_to_json(log_file, output_file)
         
+        sys.stdout.flush()
         print("\n" + "="*70)
         print("✅ MONITORING COMPLETED")
         print("="*70)
         print(f"Total samples: {sample_count}")
-        print(f"Duration: {(time.time() - start_time)/3600:.2f} hours")
+        print(f"Duration: {(time.monotonic() - start_time)/3600:.2f} hours")
         print(f"JSON output: {output_file}")
         print(f"CSV output: {csv_file}")
+        print_recent_window(recent)
         print("="*70 + "\n")
         
     except KeyboardInterrupt:
+        sys.stdout.flush()
         print("\n\n⚠️  Monitoring interrupted by user")
         print(f"Collected {sample_count} samples before interruption")
+        print_recent_window(recent)
         
         # Save partial results
-        with open(output_file, 'w') as f:
-            json.dump(all_metrics, f, indent=2, default=str)
+        _stop_writer(writer_q, writer)
+        ndjson_to_json(log_file, output_file)
         print(f"💾 Partial results saved to {output_file}")
         
     finally:
+        _stop_writer(writer_q, writer)
         monitor.close()
 
 
-def generate_csv_summary(metrics_data, csv_file):
-    """Generate CSV summary for Excel analysis"""
+# Number of recent sample summaries kept in memory for the console
+RECENT_WINDOW = 100
+
+# Per-sample console output is flushed every this many samples
+CONSOLE_FLUSH_EVERY = 10
+
+
+def print_recent_window(recent):
+    """Print averages and peaks over the recent sample summaries"""
+    if not recent:
+        return
+    cpu = [s.cpu_pct or 0 for s in recent]
+    iops = [s.total_iops or 0 for s in recent]
+    tps = [s.tps or 0 for s in recent]
+    print(f"Last {len(recent)} samples: "
+          f"CPU avg {sum(cpu)/len(cpu):.1f}% / peak {max(cpu):g}% | "
+          f"IOPS avg {sum(iops)/len(iops):.1f} / peak {max(iops):g} | "
+          f"TPS avg {sum(tps)/len(tps):.1f} / peak {max(tps):g}")
+
+
+def _writer_loop(writer_q, log_file, csv_file, strict_csv=False):
+    """
+    Background writer: append queued samples to the NDJSON log and CSV summary
+    
+    Args:
+        writer_q: Queue of (metrics, sample) tuples; None stops the writer
+        log_file: NDJSON log filename
+        csv_file: CSV summary filename
+        strict_csv: Always write rows through the csv module
+    """
+    with open(log_file, 'wb') as log, open(csv_file, 'w', newline='') as csv_out:
+        csv_writer = csv.writer(csv_out)
+        csv_writer.writerow(CSV_HEADER)
+        
+        while True:
+            item = writer_q.get()
+            if item is None:
+                break
+            
+            metrics, sample = item
+            try:
+                log.write(dumps_sample(metrics) + b'\n')
+                log.flush()
+                write_csv_row(csv_out, csv_writer, sample, strict_csv)
+            except Exception as e:
+                print(f"⚠️  Write error: {str(e)}")
+
+
+def _stop_writer(writer_q, writer):
+    """Flush pending samples and wait for the writer thread to finish"""
+    if writer.is_alive():
+        writer_q.put(None)
+        writer.join()
+
+
+def _json_default(value):
+    """Convert DMV value types that are not JSON-native"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps_sample(sample):
+    """Serialize one metrics sample as compact UTF-8 JSON, using orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(sample, default=_json_default)
+    return json.dumps(sample, default=_json_default).encode('utf-8')
+
+
+def ndjson_to_json(ndjson_file, json_file):
+    """
+    Wrap an NDJSON sample log into the JSON array consumed by the toolkit
+    
+    The log is removed once the JSON file has been written.
+    
+    Args:
+        ndjson_file: Input file with one JSON sample per line
+        json_file: Output JSON filename
+    """
+    with open(ndjson_file, 'r', encoding='utf-8') as src, open(json_file, 'w', encoding='utf-8') as dst:
+        dst.write('[')
+        separator = '\n'
+        for line in src:
+            line = line.strip()
+            if line:
+                dst.write(separator + line)
+                separator = ',\n'
+        dst.write('\n]\n')
+    
+    os.remove(ndjson_file)
+
+
+CSV_HEADER = [
+    'Timestamp', 'CPU %', 'RAM %', 'Buffer Pool MB', 'Page Life Exp (s)',
+    'Total IOPS', 'Avg Read Latency (ms)', 'Avg Write Latency (ms)',
+    'Transactions/sec', 'Batch Requests/sec', 'Top Wait Type', 'Wait Time (s)'
+]
+
+
+class Sample(NamedTuple):
+    """Flat per-sample summary, in CSV column order"""
+    timestamp: str
+    cpu_pct: float
+    ram_pct: float
+    buffer_pool_mb: int
+    page_life_expectancy_sec: int
+    total_iops: float
+    avg_read_latency_ms: float
+    avg_write_latency_ms: float
+    tps: float
+    batch_requests_per_sec: float
+    top_wait_type: str
+    top_wait_time_sec: float
+
+
+def summarize_metrics(sample):
+    """
+    Compute the headline values of a metrics sample
+    
+    Shared by the console output and the CSV summary, and stored on each
+    sample as 'summary' so consumers of the JSON do not need to recompute it.
+    
+    Returns:
+        Sample tuple
+    """
+    cpu = sample['cpu'][0] if sample.get('cpu') else {}
+    memory = sample['memory'][0] if sample.get('memory') else {}
+    transactions = sample['transactions'][0] if sample.get('transactions') else {}
+    top_wait = sample['wait_stats'][0] if sample.get('wait_stats') else {}
+    
+    total_iops = read_lat = write_lat = 0
+    disk_io = sample.get('disk_io', [])
+    for db in disk_io:
+        total_iops += db.get('total_iops', 0)
+        read_lat += db.get('avg_read_latency_ms', 0)
+        write_lat += db.get('avg_write_latency_ms', 0)
+    db_count = max(len(disk_io), 1)
+    
+    return Sample(
+        timestamp=sample.get('timestamp', ''),
+        cpu_pct=cpu.get('cpu_usage_pct', 0),
+        ram_pct=memory.get('ram_usage_pct', 0),
+        buffer_pool_mb=memory.get('buffer_pool_mb', 0),
+        page_life_expectancy_sec=memory.get('page_life_expectancy_sec', 0),
+        total_iops=total_iops,
+        avg_read_latency_ms=round(read_lat / db_count, 2),
+        avg_write_latency_ms=round(write_lat / db_count, 2),
+        tps=transactions.get('transactions_per_sec', 0),
+        batch_requests_per_sec=transactions.get('batch_requests_per_sec', 0),
+        top_wait_type=top_wait.get('wait_type', ''),
+        top_wait_time_sec=top_wait.get('wait_time_sec', 0)
+    )
+
+
+def write_csv_row(csv_out, csv_writer, sample, strict=False):
+    """
+    Write one Sample as a CSV summary row
+    
+    Rows are formatted directly with an f-string; every field is numeric
+    except the timestamp and the wait type, neither of which can contain a
+    comma. Rows with unexpected values (e.g. NULL counters) and --strict-csv
+    go through the csv module instead.
+    """
+    if not strict:
+        try:
+            csv_out.write(
+                f"{sample.timestamp},{sample.cpu_pct:g},{sample.ram_pct:g},"
+                f"{sample.buffer_pool_mb},{sample.page_life_expectancy_sec},{sample.total_iops:g},"
+                f"{sample.avg_read_latency_ms:.2f},{sample.avg_write_latency_ms:.2f},"
+                f"{sample.tps:g},{sample.batch_requests_per_sec:g},"
+                f"{sample.top_wait_type},{sample.top_wait_time_sec:g}\r\n"
+            )
+            return
+        except (TypeError, ValueError):
+            pass
+    csv_writer.writerow(sample)
+
+
+def generate_csv_summary(metrics_data, csv_file, strict=False):
+    """
+    Generate CSV summary for Excel analysis from already collected samples
+    
+    The monitor writes the summary while sampling; this is kept to rebuild
+    it from a saved JSON file.
+    """
     if not metrics_data:
         return
     
     with open(csv_file, 'w', newline='') as f:
         writer = csv.writer(f)
-        
-        # Header
-        writer.writerow([
-            'Timestamp', 'CPU %', 'RAM %', 'Buffer Pool MB', 'Page Life Exp (s)',
-            'Total IOPS', 'Avg Read Latency (ms)', 'Avg Write Latency (ms)',
-            'Transactions/sec', 'Batch Requests/sec', 'Top Wait Type', 'Wait Time (s)'
-        ])
-        
-        # Data rows
+        writer.writerow(CSV_HEADER)
         for sample in metrics_data:
-            timestamp = sample.get('timestamp', '')
-            
-            cpu_pct = sample['cpu'][0].get('cpu_usage_pct', 0) if sample.get('cpu') else 0
-            
-            ram_pct = sample['memory'][0].get('ram_usage_pct', 0) if sample.get('memory') else 0
-            buffer_pool = sample['memory'][0].get('buffer_pool_mb', 0) if sample.get('memory') else 0
-            ple = sample['memory'][0].get('page_life_expectancy_sec', 0) if sample.get('memory') else 0
-            
-            total_iops = sum(db.get('total_iops', 0) for db in sample.get('disk_io', []))
-            avg_read_lat = sum(db.get('avg_read_latency_ms', 0) for db in sample.get('disk_io', [])) / max(len(sample.get('disk_io', [])), 1)
-            avg_write_lat = sum(db.get('avg_write_latency_ms', 0) for db in sample.get('disk_io', [])) / max(len(sample.get('disk_io', [])), 1)
-            
-            tps = sample['transactions'][0].get('transactions_per_sec', 0) if sample.get('transactions') else 0
-            batch_req = sample['transactions'][0].get('batch_requests_per_sec', 0) if sample.get('transactions') else 0
-            
-            top_wait = sample['wait_stats'][0].get('wait_type', '') if sample.get('wait_stats') else ''
-            wait_time = sample['wait_stats'][0].get('wait_time_sec', 0) if sample.get('wait_stats') else 0
-            
-            writer.writerow([
-                timestamp, cpu_pct, ram_pct, buffer_pool, ple,
-                total_iops, f"{avg_read_lat:.2f}", f"{avg_write_lat:.2f}",
-                tps, batch_req, top_wait, wait_time
-            ])
+            write_csv_row(f, writer, summarize_metrics(sample), strict)
     
     print(f"✅ CSV summary generated: {csv_file}")
 
 
-def main():
-    """Main entry point"""
-    parser = argparse.ArgumentParser(
-        description='SQL Server Workload Monitor - Capture performance metrics for Azure migration analysis',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
+_EPILOG = """
 Examples:
   # Monitor with Windows authentication for 24 hours
   python monitor_sql_workload.py --server SQLPROD01 --database master --interval 120 --duration 86400
@@ -437,9 +1120,18 @@ Examples:
   python monitor_sql_workload.py --server localhost --database master --interval 30 --duration 600
 
 Output Files:
-  - sql_workload_YYYYMMDD_HHMMSS.json - Complete metrics in JSON format
+  - sql_workload_YYYYMMDD_HHMMSS.json - Complete metrics in JSON format (authoritative;
+    samples are streamed to disk, only the last few are kept in memory)
   - sql_workload_YYYYMMDD_HHMMSS_summary.csv - Summary for Excel analysis
-        """
+"""
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(
+        description='SQL Server Workload Monitor - Capture performance metrics for Azure migration analysis',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=_EPILOG
     )
     
     # Connection parameters
@@ -456,12 +1148,23 @@ Output Files:
     parser.add_argument('--duration', type=int, default=86400,
                        help='Total monitoring duration in seconds (default: 86400 = 24 hours)')
     
+    parser.add_argument('--legacy-cpu', action='store_true',
+                       help='Compute CPU %% from wait statistics instead of the scheduler ring buffer')
+    parser.add_argument('--include-system-dbs', action='store_true',
+                       help='Report disk I/O and sizes for all databases, system ones included')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                       help='Run snapshot queries concurrently over several connections (requires aioodbc)')
+    
     # Output parameters
-    parser.add_argument('--output', 
-                       default=f"sql_workload_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                       help='Output JSON filename')
+    parser.add_argument('--output', default=None,
+                       help='Output JSON filename (default: sql_workload_YYYYMMDD_HHMMSS.json)')
+    parser.add_argument('--quiet', action='store_true',
+                       help='Do not print the per-sample summary')
+    parser.add_argument('--strict-csv', action='store_true',
+                       help='Write the CSV summary through the csv module (slower, fully quoted-safe)')
     
     args = parser.parse_args()
+    args.output = args.output or f"sql_workload_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
     
     # Validate parameters
     if args.interval < 10:
@@ -483,7 +1186,12 @@ Output Files:
         trusted_connection=use_trusted,
         interval=args.interval,
         duration=args.duration,
-        output_file=args.output
+        output_file=args.output,
+        legacy_cpu=args.legacy_cpu,
+        include_system_dbs=args.include_system_dbs,
+        quiet=args.quiet,
+        use_async=args.use_async,
+        strict_csv=args.strict_csv
     )
 
 
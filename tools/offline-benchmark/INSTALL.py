@@ -16,8 +16,29 @@ import os
 import shutil
 import argparse
 import subprocess
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import pyodbc
+except ImportError:
+    pyodbc = None
+
+# Helpers compartidos con los scripts (scripts/conn.py, scripts/capture.py);
+# si faltan, check_scripts() lo reporta en lugar de abortar con un traceback
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'scripts'))
+try:
+    from conn import build_conn_str
+except ImportError:
+    build_conn_str = None
+
+try:
+    from capture import run_captured
+except ImportError:
+    run_captured = None
+
 
 def print_banner():
     """Imprime banner del instalador."""
@@ -47,14 +68,19 @@ def check_pyodbc() -> bool:
     """Verifica instalación de pyodbc."""
     print("[2/8] Checking pyodbc installation...")
     
-    try:
-        import pyodbc
-        print(f"  [OK] pyodbc {pyodbc.version} installed")
-        return True
-    except ImportError:
+    if pyodbc is None:
         print("  [FAIL] pyodbc not installed")
         print("  Install with: pip install pyodbc")
         return False
+    
+    print(f"  [OK] pyodbc {pyodbc.version} installed")
+    return True
+
+
+@functools.lru_cache(maxsize=1)
+def _odbc_drivers() -> tuple:
+    """Lista de drivers ODBC instalados (registro / odbcinst.ini), leída una vez."""
+    return tuple(pyodbc.drivers())
 
 
 def check_odbc_driver() -> bool:
@@ -62,22 +88,24 @@ def check_odbc_driver() -> bool:
     print("[3/8] Checking ODBC driver...")
     
     try:
-        import pyodbc
-        drivers = pyodbc.drivers()
+        # Una sola pasada: Driver 17 gana, si no el primer driver SQL Server
+        best = None
+        for driver in _odbc_drivers():
+            if driver == 'ODBC Driver 17 for SQL Server':
+                print("  [OK] ODBC Driver 17 for SQL Server found")
+                return True
+            if best is None and 'SQL Server' in driver:
+                best = driver
         
-        if 'ODBC Driver 17 for SQL Server' in drivers:
-            print("  [OK] ODBC Driver 17 for SQL Server found")
+        if best is not None:
+            print(f"  [WARN] Using {best} (Driver 17 recommended)")
             return True
-        elif any('SQL Server' in d for d in drivers):
-            other = [d for d in drivers if 'SQL Server' in d][0]
-            print(f"  [WARN] Using {other} (Driver 17 recommended)")
-            return True
-        else:
-            print("  [FAIL] No SQL Server ODBC driver found")
-            print("  Install ODBC Driver 17 for SQL Server:")
-            print("    Linux:   https://docs.microsoft.com/sql/connect/odbc/linux-mac/installing-the-microsoft-odbc-driver-for-sql-server")
-            print("    Windows: https://docs.microsoft.com/sql/connect/odbc/download-odbc-driver-for-sql-server")
-            return False
+        
+        print("  [FAIL] No SQL Server ODBC driver found")
+        print("  Install ODBC Driver 17 for SQL Server:")
+        print("    Linux:   https://docs.microsoft.com/sql/connect/odbc/linux-mac/installing-the-microsoft-odbc-driver-for-sql-server")
+        print("    Windows: https://docs.microsoft.com/sql/connect/odbc/download-odbc-driver-for-sql-server")
+        return False
             
     except Exception as e:
         print(f"  [FAIL] Error checking ODBC driver: {e}")
@@ -88,66 +116,122 @@ def check_scripts() -> bool:
     """Verifica que los scripts necesarios existan."""
     print("[4/8] Checking script files...")
     
-    required_files = [
+    required_files = {
         'monitor_sql_workload.py',
         'workload-sample-query.sql',
         'check_monitoring_status.py',
         'diagnose_monitoring.py',
-        'Generate-SQLWorkload.py'
-    ]
+        'Generate-SQLWorkload.py',
+        'conn.py',
+        'capture.py'
+    }
     
-    missing = []
-    for filename in required_files:
-        if not os.path.exists(filename):
-            missing.append(filename)
+    # Un único readdir en lugar de un stat() por fichero
+    with os.scandir('.') as entries:
+        present = {e.name for e in entries if e.is_file()}
+    missing = required_files - present
     
     if missing:
-        print(f"  [FAIL] Missing files: {', '.join(missing)}")
+        print(f"  [FAIL] Missing files: {', '.join(sorted(missing))}")
         return False
     
     print(f"  [OK] All {len(required_files)} required files found")
     return True
 
 
-def test_connectivity(server: str, username: str = None, password: str = None) -> bool:
+SERVER_INFO_QUERY = "SELECT @@SERVERNAME, @@VERSION"
+
+PERMISSIONS_QUERY = """
+    SELECT 
+        SUSER_SNAME() AS CurrentUser,
+        HAS_PERMS_BY_NAME(NULL, NULL, 'VIEW SERVER STATE') AS HasViewServerState,
+        IS_SRVROLEMEMBER('sysadmin') AS IsSysAdmin
+"""
+
+
+def open_connection(server: str, username: str = None, password: str = None):
+    """Abre una conexión a SQL Server."""
+    if build_conn_str is None:
+        raise RuntimeError("scripts/conn.py is missing")
+    return pyodbc.connect(build_conn_str(server, 'master', username, password, username is None, timeout=10))
+
+
+PROBE_STEPS = ('server', 'permissions', 'query')
+
+
+def run_probe(conn) -> dict:
+    """
+    Ejecuta las consultas de validación sobre una conexión abierta.
+    
+    Servidor y permisos viajan en un único batch leído con nextset(); la
+    query de monitorización se ejecuta aparte para medir solo su tiempo.
+    
+    Returns:
+        Dict con (row, error) para 'server', 'permissions' y 'query',
+        más 'duration' (segundos de la query de monitorización)
+    """
+    results = {'duration': None}
+    cursor = conn.cursor()
+    
+    try:
+        try:
+            cursor.execute(f"{SERVER_INFO_QUERY};\n{PERMISSIONS_QUERY}")
+            results['server'] = (cursor.fetchone(), None)
+            cursor.nextset()
+            results['permissions'] = (cursor.fetchone(), None)
+        except Exception as e:
+            # Un error en el primer statement deja sin resultado al segundo
+            results.setdefault('server', (None, e))
+            results.setdefault('permissions', (None, e))
+        
+        try:
+            with open('workload-sample-query.sql', 'r', encoding='utf-8') as f:
+                query = f.read()
+            
+            start = time.time()
+            row = cursor.execute(query).fetchone()
+            results['duration'] = time.time() - start
+            results['query'] = (row, None)
+        except Exception as e:
+            results['query'] = (None, e)
+    finally:
+        cursor.close()
+    
+    return results
+
+
+def probe_server(server: str, username: str = None, password: str = None) -> dict:
+    """
+    Abre una conexión, ejecuta run_probe() y la cierra.
+    
+    Si no se puede conectar, cada paso lleva el error de conexión para que
+    los checks SQL lo reporten por su cuenta.
+    """
+    try:
+        conn = open_connection(server, username, password)
+    except Exception as e:
+        failed = dict.fromkeys(PROBE_STEPS, (None, e))
+        failed['duration'] = None
+        return failed
+    
+    try:
+        return run_probe(conn)
+    finally:
+        conn.close()
+
+
+def test_connectivity(probe: dict) -> bool:
     """Prueba conectividad a SQL Server."""
     print("[5/8] Testing SQL Server connectivity...")
     
     try:
-        import pyodbc
-        
-        trusted = username is None
-        
-        if trusted:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"Trusted_Connection=yes;"
-                f"Connection Timeout=10;"
-            )
-        else:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"UID={username};"
-                f"PWD={password};"
-                f"Connection Timeout=10;"
-            )
-        
-        conn = pyodbc.connect(conn_str)
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT @@SERVERNAME, @@VERSION")
-        row = cursor.fetchone()
+        row, error = probe['server']
+        if error:
+            raise error
         
         print(f"  [OK] Connected to: {row[0]}")
         print(f"       Version: {row[1].split(chr(10))[0][:60]}")
         
-        cursor.close()
-        conn.close()
-        
         return True
         
     except Exception as e:
@@ -155,59 +239,26 @@ def test_connectivity(server: str, username: str = None, password: str = None) -
         return False
 
 
-def check_permissions(server: str, username: str = None, password: str = None) -> bool:
+def check_permissions(probe: dict) -> bool:
     """Verifica permisos VIEW SERVER STATE."""
     print("[6/8] Checking permissions...")
     
     try:
-        import pyodbc
-        
-        trusted = username is None
-        
-        if trusted:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"Trusted_Connection=yes;"
-            )
-        else:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"UID={username};"
-                f"PWD={password};"
-            )
-        
-        conn = pyodbc.connect(conn_str)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                SUSER_SNAME() AS CurrentUser,
-                HAS_PERMS_BY_NAME(NULL, NULL, 'VIEW SERVER STATE') AS HasViewServerState,
-                IS_SRVROLEMEMBER('sysadmin') AS IsSysAdmin
-        """)
-        row = cursor.fetchone()
+        row, error = probe['permissions']
+        if error:
+            raise error
         
         print(f"  User: {row.CurrentUser}")
         
         if row.IsSysAdmin == 1:
             print(f"  [OK] User is sysadmin")
-            cursor.close()
-            conn.close()
             return True
         elif row.HasViewServerState == 1:
             print(f"  [OK] User has VIEW SERVER STATE permission")
-            cursor.close()
-            conn.close()
             return True
         else:
             print(f"  [FAIL] User lacks VIEW SERVER STATE permission")
             print(f"  Grant with: GRANT VIEW SERVER STATE TO [{row.CurrentUser}]")
-            cursor.close()
-            conn.close()
             return False
             
     except Exception as e:
@@ -215,43 +266,15 @@ def check_permissions(server: str, username: str = None, password: str = None) -
         return False
 
 
-def test_query(server: str, username: str = None, password: str = None) -> bool:
+def test_query(probe: dict) -> bool:
     """Prueba ejecución de query de monitorización."""
     print("[7/8] Testing monitoring query...")
     
     try:
-        import pyodbc
-        import time
-        
-        # Leer query
-        with open('workload-sample-query.sql', 'r', encoding='utf-8') as f:
-            query = f.read()
-        
-        trusted = username is None
-        
-        if trusted:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"Trusted_Connection=yes;"
-            )
-        else:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"UID={username};"
-                f"PWD={password};"
-            )
-        
-        conn = pyodbc.connect(conn_str)
-        cursor = conn.cursor()
-        
-        start = time.time()
-        cursor.execute(query)
-        row = cursor.fetchone()
-        duration = time.time() - start
+        row, error = probe['query']
+        if error:
+            raise error
+        duration = probe['duration']
         
         print(f"  [OK] Query executed in {duration:.3f} seconds")
         
@@ -264,9 +287,6 @@ def test_query(server: str, username: str = None, password: str = None) -> bool:
         if duration > 2.0:
             print(f"  [WARN] Query took > 2 seconds (consider optimization)")
         
-        cursor.close()
-        conn.close()
-        
         return True
         
     except Exception as e:
@@ -296,6 +316,13 @@ def create_directories() -> bool:
         return False
 
 
+# Sin Python, pyodbc o driver ODBC no tiene sentido seguir
+CRITICAL_CHECKS = (check_python_version, check_pyodbc, check_odbc_driver)
+
+# Checks locales sin dependencias entre sí: se ejecutan en paralelo
+PARALLEL_CHECKS = (check_scripts, create_directories)
+
+
 def print_usage():
     """Imprime instrucciones de uso."""
     print("")
@@ -358,27 +385,57 @@ def main():
     ]
     
     if not args.skip_connectivity:
+        # Una sola sonda compartida por los checks SQL (se ejecuta al llegar a ellos)
+        sql_args = [None]
         checks.extend([
-            ('SQL Connectivity', test_connectivity, [args.server, args.username, args.password]),
-            ('User Permissions', check_permissions, [args.server, args.username, args.password]),
-            ('Query Test', test_query, [args.server, args.username, args.password]),
+            ('SQL Connectivity', test_connectivity, sql_args),
+            ('User Permissions', check_permissions, sql_args),
+            ('Query Test', test_query, sql_args),
         ])
     
     checks.append(('Directories', create_directories, []))
     
-    # Ejecutar todos los checks
     all_passed = True
     
+    # Checks críticos primero y en serie: si fallan se sale sin haber
+    # lanzado ningún otro check (ni creado directorios)
     for check_name, check_func, check_args in checks:
-        result = check_func(*check_args)
-        if not result:
-            all_passed = False
-            if check_name in ['Python Version', 'pyodbc Module', 'ODBC Driver']:
-                # Checks críticos - no continuar
-                print("")
-                print(f"[FAIL] Critical check failed: {check_name}")
-                print("Please fix the issue and run the installer again.")
-                sys.exit(1)
+        if check_func in CRITICAL_CHECKS and not check_func(*check_args):
+            print("")
+            print(f"[FAIL] Critical check failed: {check_name}")
+            print("Please fix the issue and run the installer again.")
+            sys.exit(1)
+    
+    # Resto: los locales en paralelo, los SQL en serie sobre una única
+    # sonda; la salida se imprime en el orden de la lista
+    # (sin capture.py todos se ejecutan en serie)
+    parallel = run_captured is not None
+    pool = ThreadPoolExecutor(max_workers=len(PARALLEL_CHECKS)) if parallel else None
+    
+    try:
+        futures = {
+            check_name: pool.submit(run_captured, check_func, *check_args)
+            for check_name, check_func, check_args in checks
+            if parallel and check_func in PARALLEL_CHECKS
+        }
+        
+        for check_name, check_func, check_args in checks:
+            if check_func in CRITICAL_CHECKS:
+                continue
+            if check_name in futures:
+                output, result = futures[check_name].result()
+                sys.stdout.write(output)
+            elif check_func is test_connectivity:
+                check_args[0] = probe_server(args.server, args.username, args.password)
+                result = check_func(*check_args)
+            else:
+                result = check_func(*check_args)
+            
+            if not result:
+                all_passed = False
+    finally:
+        if pool is not None:
+            pool.shutdown()
     
     print("")
     
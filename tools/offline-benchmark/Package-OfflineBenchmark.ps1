@@ -112,6 +112,8 @@ try {
         Copy-PackageFile "scripts\check_monitoring_status.py" "$PackageDir\scripts\"
         Copy-PackageFile "scripts\diagnose_monitoring.py" "$PackageDir\scripts\"
         Copy-PackageFile "scripts\Generate-SQLWorkload.py" "$PackageDir\scripts\"
+        Copy-PackageFile "scripts\conn.py" "$PackageDir\scripts\"
+        Copy-PackageFile "scripts\capture.py" "$PackageDir\scripts\"
         Copy-PackageFile "INSTALL.py" "$PackageDir\"
         Write-Host ""
     }
@@ -167,6 +169,8 @@ $(if($IncludePython){@"
   - check_monitoring_status.py    : Status checker (Python)
   - diagnose_monitoring.py        : Diagnostic tool (Python)
   - Generate-SQLWorkload.py       : Workload generator (Python)
+  - conn.py                       : Shared connection helpers (Python)
+  - capture.py                    : Shared output capture helpers (Python)
   - INSTALL.py                    : Automated installer (Python)
   - README-Python.md              : Python documentation
 "@}else{""})
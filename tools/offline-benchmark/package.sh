@@ -39,6 +39,8 @@ cp scripts/workload-sample-query.sql "${PACKAGE_DIR}/scripts/"
 cp scripts/check_monitoring_status.py "${PACKAGE_DIR}/scripts/"
 cp scripts/diagnose_monitoring.py "${PACKAGE_DIR}/scripts/"
 cp scripts/Generate-SQLWorkload.py "${PACKAGE_DIR}/scripts/"
+cp scripts/conn.py "${PACKAGE_DIR}/scripts/"
+cp scripts/capture.py "${PACKAGE_DIR}/scripts/"
 chmod +x "${PACKAGE_DIR}"/scripts/*.py
 
 echo "[3/7] Copying documentation..."
@@ -76,6 +78,8 @@ Contents:
   - check_monitoring_status.py    : Status checker
   - diagnose_monitoring.py        : Diagnostic tool
   - Generate-SQLWorkload.py       : Workload generator
+  - conn.py                       : Shared connection helpers
+  - capture.py                    : Shared output capture helpers
   - INSTALL.py                    : Automated installer
   - README.md                     : Complete documentation
   - docs/                         : Additional guides
@@ -17,14 +17,72 @@ Uso:
     python Generate-SQLWorkload.py --server . --intensity high --duration 120 --pattern continuous
 """
 
-import pyodbc
 import sys
 import argparse
 import time
 import random
-from datetime import datetime, timedelta
+import itertools
 from typing import Optional
 import threading
+import queue
+from conn import build_conn_str
+import multiprocessing
+
+# Módulos pesados: se cargan en _import_runtime() al crear el generador,
+# así --help no paga la carga de la librería ODBC nativa
+pyodbc = None
+asyncio = None
+aioodbc = None
+np = None
+
+
+def _import_runtime():
+    """Importa pyodbc, asyncio y las dependencias opcionales (aioodbc, numpy)."""
+    global pyodbc, asyncio, aioodbc, np
+    
+    import pyodbc
+    import asyncio
+    
+    try:
+        import aioodbc
+    except ImportError:
+        aioodbc = None
+    
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+
+class PooledConnection:
+    """
+    Conexión del pool compartido con un cursor por query.
+    
+    Cada cursor re-ejecuta siempre el mismo texto, así pyodbc conserva su
+    statement handle y SQL Server reutiliza el plan cacheado.
+    """
+    
+    def __init__(self, conn: Optional['pyodbc.Connection'] = None):
+        self.conn = conn
+        self.cursors = {}
+        self.last_used = time.monotonic()
+    
+    def cursor(self, qid: int):
+        """Devuelve el cursor dedicado a una query, creándolo si no existe."""
+        cursor = self.cursors.get(qid)
+        if cursor is None:
+            cursor = self.cursors[qid] = self.conn.cursor()
+        return cursor
+    
+    def reset(self):
+        """Cierra la conexión; se reabrirá en el siguiente checkout."""
+        try:
+            if self.conn is not None:
+                self.conn.close()
+        except pyodbc.Error:
+            pass
+        self.conn = None
+        self.cursors = {}
 
 
 class WorkloadGenerator:
@@ -32,6 +90,113 @@ class WorkloadGenerator:
     Generador de workload sintético para SQL Server.
     """
     
+    # Queries ligeras (DMV reads, cálculos simples)
+    LIGHT_QUERIES = (
+        "SELECT COUNT(*) FROM sys.databases",
+        "SELECT COUNT(*) FROM sys.objects WHERE type = 'U'",
+        "SELECT @@VERSION",
+        "SELECT GETDATE(), @@SERVERNAME",
+        "SELECT name, database_id FROM sys.databases",
+        "SELECT name, object_id FROM sys.objects WHERE type = 'U'",
+        "SELECT SUM(size) FROM sys.master_files",
+    )
+    
+    # Queries medianas (joins, aggregaciones)
+    MEDIUM_QUERIES = (
+        """
+        SELECT 
+            d.name,
+            COUNT(*) as TableCount
+        FROM sys.databases d
+        CROSS APPLY (
+            SELECT TOP 100 * FROM sys.objects WHERE type = 'U'
+        ) o
+        GROUP BY d.name
+        """,
+        """
+        SELECT 
+            type,
+            COUNT(*) as ObjectCount,
+            AVG(object_id) as AvgObjectId
+        FROM sys.objects
+        GROUP BY type
+        """,
+        """
+        WITH Numbers AS (
+            SELECT TOP 1000 ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) as n
+            FROM sys.objects a, sys.objects b
+        )
+        SELECT AVG(n), SUM(n), MIN(n), MAX(n)
+        FROM Numbers
+        """,
+        """
+        SELECT 
+            mf.name,
+            mf.size * 8 / 1024 as SizeMB,
+            mf.growth,
+            d.name as DatabaseName
+        FROM sys.master_files mf
+        JOIN sys.databases d ON mf.database_id = d.database_id
+        ORDER BY mf.size DESC
+        """
+    )
+    
+    # Queries pesadas (cross joins, grandes resultados)
+    HEAVY_QUERIES = (
+        """
+        WITH Numbers AS (
+            SELECT TOP 10000 ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) as n
+            FROM sys.all_objects a
+            CROSS JOIN sys.all_objects b
+        )
+        SELECT 
+            n,
+            n * n as Squared,
+            n * n * n as Cubed,
+            SQRT(CAST(n as FLOAT)) as SquareRoot
+        FROM Numbers
+        WHERE n % 2 = 0
+        """,
+        """
+        SELECT 
+            o1.name as Object1,
+            o2.name as Object2,
+            o1.object_id + o2.object_id as CombinedId
+        FROM sys.objects o1
+        CROSS JOIN sys.objects o2
+        WHERE o1.object_id < 1000 AND o2.object_id < 1000
+        """,
+        """
+        WITH RECURSIVE Numbers(n) AS (
+            SELECT 1
+            UNION ALL
+            SELECT n + 1 FROM Numbers WHERE n < 5000
+        )
+        SELECT 
+            AVG(CAST(n as FLOAT)) as Average,
+            STDEV(CAST(n as FLOAT)) as StdDev,
+            VAR(CAST(n as FLOAT)) as Variance
+        FROM Numbers
+        OPTION (MAXRECURSION 5000)
+        """
+    )
+    
+    # Queries ligeras enviadas por batch en intensidad 'light'
+    LIGHT_BATCH = 8
+    
+    # Segundos de inactividad tras los que se valida una conexión con SELECT 1
+    VALIDATE_AFTER = 30
+    
+    # Índices de query pre-sorteados por llamada a numpy (si está disponible)
+    RNG_BUFFER = 1024
+    
+    # Mezcla por intensidad: (queries, probabilidad del grupo)
+    INTENSITY_MIX = {
+        'light': ((LIGHT_QUERIES, 1.0),),
+        'medium': ((MEDIUM_QUERIES, 0.7), (LIGHT_QUERIES, 0.3)),
+        'high': ((HEAVY_QUERIES, 0.5), (MEDIUM_QUERIES, 0.3), (LIGHT_QUERIES, 0.2)),
+    }
+    
     def __init__(
         self,
         server: str,
@@ -41,151 +206,139 @@ class WorkloadGenerator:
         trusted_connection: bool = True
     ):
         """Inicializa generador de workload."""
+        if pyodbc is None:
+            _import_runtime()
+        
         self.server = server
         self.database = database
         self.username = username
         self.password = password
         self.trusted_connection = trusted_connection
         self.active = False
-        self.queries_executed = 0
-        self.errors = 0
+        self._stamp_cache = (0, '')
+        self._pool = queue.Queue()
+        self._query_texts = []
+        
+        # Contadores por thread: cada worker solo escribe en su propia
+        # entrada [queries, errores], así no se pierden incrementos
+        self._per_thread_stats = {}
         
+        # Pool plano por intensidad con pesos acumulados para random.choices
+        self._query_pool = {}
+        for intensity, mix in self.INTENSITY_MIX.items():
+            queries = []
+            weights = []
+            for group, probability in mix:
+                queries.extend(map(sys.intern, group))
+                weights.extend([probability / len(group)] * len(group))
+            self._query_pool[intensity] = (queries, list(itertools.accumulate(weights)))
+        
+    def _timestamp(self) -> str:
+        """Timestamp de log, formateado como mucho una vez por segundo."""
+        tick = int(time.time())
+        cached_tick, stamp = self._stamp_cache
+        if tick != cached_tick:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(tick))
+            self._stamp_cache = (tick, stamp)
+        return stamp
+    
     def log_info(self, message: str):
         """Log informational message."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] [INFO] {message}", flush=True)
+        print(f"[{self._timestamp()}] [INFO] {message}")
     
     def log_ok(self, message: str):
         """Log success message."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] [OK] {message}", flush=True)
+        print(f"[{self._timestamp()}] [OK] {message}")
     
     def log_fail(self, message: str):
         """Log failure message."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] [FAIL] {message}", flush=True)
+        print(f"[{self._timestamp()}] [FAIL] {message}", flush=True)
+    
+    def _conn_str(self) -> str:
+        """Construye la cadena de conexión ODBC."""
+        return build_conn_str(self.server, self.database, self.username, self.password,
+                              self.trusted_connection)
     
-    def connect(self) -> Optional[pyodbc.Connection]:
+    def connect(self) -> Optional['pyodbc.Connection']:
         """Crea nueva conexión a SQL Server."""
         try:
-            if self.trusted_connection:
-                conn_str = (
-                    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                    f"SERVER={self.server};"
-                    f"DATABASE={self.database};"
-                    f"Trusted_Connection=yes;"
-                )
-            else:
-                conn_str = (
-                    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                    f"SERVER={self.server};"
-                    f"DATABASE={self.database};"
-                    f"UID={self.username};"
-                    f"PWD={self.password};"
-                )
-            
-            return pyodbc.connect(conn_str)
+            return pyodbc.connect(self._conn_str())
             
         except Exception as e:
             self.log_fail(f"Connection failed: {e}")
             return None
     
-    def generate_light_query(self) -> str:
-        """Genera query ligera (DMV reads, cálculos simples)."""
-        queries = [
-            "SELECT COUNT(*) FROM sys.databases",
-            "SELECT COUNT(*) FROM sys.objects WHERE type = 'U'",
-            "SELECT @@VERSION",
-            "SELECT GETDATE(), @@SERVERNAME",
-            "SELECT name, database_id FROM sys.databases",
-            "SELECT name, object_id FROM sys.objects WHERE type = 'U'",
-            "SELECT SUM(size) FROM sys.master_files",
-        ]
-        return random.choice(queries)
-    
-    def generate_medium_query(self) -> str:
-        """Genera query mediana (joins, aggregaciones)."""
-        queries = [
-            """
-            SELECT 
-                d.name,
-                COUNT(*) as TableCount
-            FROM sys.databases d
-            CROSS APPLY (
-                SELECT TOP 100 * FROM sys.objects WHERE type = 'U'
-            ) o
-            GROUP BY d.name
-            """,
-            """
-            SELECT 
-                type,
-                COUNT(*) as ObjectCount,
-                AVG(object_id) as AvgObjectId
-            FROM sys.objects
-            GROUP BY type
-            """,
-            """
-            WITH Numbers AS (
-                SELECT TOP 1000 ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) as n
-                FROM sys.objects a, sys.objects b
-            )
-            SELECT AVG(n), SUM(n), MIN(n), MAX(n)
-            FROM Numbers
-            """,
-            """
-            SELECT 
-                mf.name,
-                mf.size * 8 / 1024 as SizeMB,
-                mf.growth,
-                d.name as DatabaseName
-            FROM sys.master_files mf
-            JOIN sys.databases d ON mf.database_id = d.database_id
-            ORDER BY mf.size DESC
-            """
-        ]
-        return random.choice(queries)
-    
-    def generate_heavy_query(self) -> str:
-        """Genera query pesada (cross joins, grandes resultados)."""
-        queries = [
-            """
-            WITH Numbers AS (
-                SELECT TOP 10000 ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) as n
-                FROM sys.all_objects a
-                CROSS JOIN sys.all_objects b
-            )
-            SELECT 
-                n,
-                n * n as Squared,
-                n * n * n as Cubed,
-                SQRT(CAST(n as FLOAT)) as SquareRoot
-            FROM Numbers
-            WHERE n % 2 = 0
-            """,
-            """
-            SELECT 
-                o1.name as Object1,
-                o2.name as Object2,
-                o1.object_id + o2.object_id as CombinedId
-            FROM sys.objects o1
-            CROSS JOIN sys.objects o2
-            WHERE o1.object_id < 1000 AND o2.object_id < 1000
-            """,
-            """
-            WITH RECURSIVE Numbers(n) AS (
-                SELECT 1
-                UNION ALL
-                SELECT n + 1 FROM Numbers WHERE n < 5000
-            )
-            SELECT 
-                AVG(CAST(n as FLOAT)) as Average,
-                STDEV(CAST(n as FLOAT)) as StdDev,
-                VAR(CAST(n as FLOAT)) as Variance
-            FROM Numbers
-            OPTION (MAXRECURSION 5000)
-            """
-        ]
-        return random.choice(queries)
+    @property
+    def queries_executed(self) -> int:
+        """Total de queries ejecutadas por todos los workers."""
+        return sum(stats[0] for stats in list(self._per_thread_stats.values()))
+    
+    @property
+    def errors(self) -> int:
+        """Total de errores de todos los workers."""
+        return sum(stats[1] for stats in list(self._per_thread_stats.values()))
+    
+    @staticmethod
+    def batch_text(texts: list, qids: list) -> str:
+        """Une varias queries en un único batch (una ida y vuelta)."""
+        return ";\n".join(texts[qid] for qid in qids)
+    
+    @staticmethod
+    def discard_rows(cursor, batch_size: int = 10000):
+        """Consume el resultado por bloques sin materializarlo entero."""
+        while cursor.fetchmany(batch_size):
+            pass
+    
+    def _checkout(self) -> Optional[PooledConnection]:
+        """
+        Toma una conexión del pool, reconectando o validando si hace falta.
+        
+        Returns:
+            PooledConnection lista para usar, o None si no hay ninguna
+            disponible (el llamador debe reintentar)
+        """
+        try:
+            entry = self._pool.get(timeout=1)
+        except queue.Empty:
+            return None
+        
+        if entry.conn is not None and time.monotonic() - entry.last_used > self.VALIDATE_AFTER:
+            try:
+                entry.conn.cursor().execute("SELECT 1").fetchall()
+            except pyodbc.Error:
+                entry.reset()
+        
+        if entry.conn is None:
+            entry.conn = self.connect()
+            if entry.conn is None:
+                # Servidor no disponible: devolver la entrada y esperar
+                self._pool.put(entry)
+                self._stop_event.wait(1)
+                return None
+        
+        return entry
+    
+    def _query_ids(self, intensity: str, batch: int):
+        """
+        Genera sin fin los índices de query de cada tick según los pesos.
+        
+        Con numpy se sortean RNG_BUFFER índices de una vez con un Generator
+        propio del worker; sin numpy se usa random.choices en cada tick.
+        """
+        cum_weights = self._query_pool[intensity][1]
+        
+        if np is None:
+            query_ids = range(len(cum_weights))
+            while True:
+                yield random.choices(query_ids, cum_weights=cum_weights, k=batch)
+        
+        rng = np.random.default_rng()
+        probabilities = np.diff(cum_weights, prepend=0.0)
+        probabilities /= probabilities.sum()
+        size = self.RNG_BUFFER - self.RNG_BUFFER % batch
+        while True:
+            draws = rng.choice(len(probabilities), size=size, p=probabilities)
+            yield from draws.reshape(-1, batch).tolist()
     
     def worker_thread(
         self,
@@ -194,62 +347,146 @@ class WorkloadGenerator:
         queries_per_minute: int
     ):
         """Thread worker que ejecuta queries."""
-        conn = self.connect()
-        if not conn:
-            return
-        
         try:
-            cursor = conn.cursor()
+            # En 'light' varias queries viajan en un mismo batch; el intervalo
+            # se escala para mantener las queries/min configuradas
+            batch = self.LIGHT_BATCH if intensity == 'light' else 1
             interval = 60.0 / queries_per_minute if queries_per_minute > 0 else 1.0
+            interval *= batch
+            texts = self._query_texts
+            picker = self._query_ids(intensity, batch)
+            
+            # Ritmo por deadline monotónico: sin deriva acumulada y sin dormir
+            # cuando la query ya consumió el intervalo
+            next_due = time.monotonic()
+            stats = self._per_thread_stats.setdefault(thread_id, [0, 0])
             
             while self.active:
+                entry = self._checkout()
+                if entry is None:
+                    continue
+                
                 try:
-                    # Seleccionar query según intensidad
-                    if intensity == 'light':
-                        query = self.generate_light_query()
-                    elif intensity == 'medium':
-                        # 70% medium, 30% light
-                        if random.random() < 0.7:
-                            query = self.generate_medium_query()
-                        else:
-                            query = self.generate_light_query()
-                    else:  # high
-                        # 50% heavy, 30% medium, 20% light
-                        rand = random.random()
-                        if rand < 0.5:
-                            query = self.generate_heavy_query()
-                        elif rand < 0.8:
-                            query = self.generate_medium_query()
-                        else:
-                            query = self.generate_light_query()
-                    
-                    # Ejecutar query
-                    cursor.execute(query)
-                    cursor.fetchall()  # Consumir resultados
+                    # Seleccionar query(s) según intensidad
+                    qids = next(picker)
                     
-                    self.queries_executed += 1
+                    # Ejecutar query; un batch usa su propio cursor
+                    if batch > 1:
+                        cursor = entry.cursor('batch')
+                        cursor.execute(self.batch_text(texts, qids))
+                        self.discard_rows(cursor)
+                        while cursor.nextset():
+                            self.discard_rows(cursor)
+                    else:
+                        cursor = entry.cursor(qids[0])
+                        cursor.execute(texts[qids[0]])
+                        self.discard_rows(cursor)
                     
-                    # Esperar intervalo
-                    time.sleep(interval)
+                    stats[0] += batch
                     
                 except Exception as e:
-                    self.errors += 1
+                    stats[1] += 1
+                    # Conexión perdida: se reabre en el siguiente checkout
+                    if isinstance(e, (pyodbc.OperationalError, pyodbc.InterfaceError)):
+                        entry.reset()
                     # No logear cada error para evitar spam
-                    if self.errors % 100 == 0:
-                        self.log_fail(f"Thread {thread_id}: {self.errors} errors so far")
-            
-            cursor.close()
-            conn.close()
+                    if stats[1] % 100 == 0:
+                        self.log_fail(f"Thread {thread_id}: {stats[1]} errors so far")
+                    
+                finally:
+                    entry.last_used = time.monotonic()
+                    self._pool.put(entry)
+                
+                # Esperar hasta el siguiente deadline (o hasta la parada)
+                next_due += interval
+                slack = next_due - time.monotonic()
+                if slack > 0 and self._stop_event.wait(slack):
+                    break
             
         except Exception as e:
             self.log_fail(f"Thread {thread_id} crashed: {e}")
     
+    async def _async_main(self, workers: int, intensity: str, queries_per_minute: int, pool_size: int):
+        """Ejecuta los workers como tareas asyncio sobre un pool aioodbc."""
+        async with aioodbc.create_pool(dsn=self._conn_str(), minsize=pool_size,
+                                       maxsize=pool_size) as aio_pool:
+            await asyncio.gather(*(
+                self._async_worker(aio_pool, i + 1, intensity, queries_per_minute)
+                for i in range(workers)
+            ))
+    
+    async def _async_worker(self, aio_pool, worker_id: int, intensity: str, queries_per_minute: int):
+        """Equivalente asyncio de worker_thread."""
+        batch = self.LIGHT_BATCH if intensity == 'light' else 1
+        interval = 60.0 / queries_per_minute if queries_per_minute > 0 else 1.0
+        interval *= batch
+        texts = self._query_texts
+        picker = self._query_ids(intensity, batch)
+        next_due = time.monotonic()
+        stats = self._per_thread_stats.setdefault(worker_id, [0, 0])
+        
+        while self.active:
+            try:
+                qids = next(picker)
+                async with aio_pool.acquire() as conn:
+                    async with conn.cursor() as cursor:
+                        await cursor.execute(self.batch_text(texts, qids))
+                        while True:
+                            while await cursor.fetchmany(10000):
+                                pass
+                            if not await cursor.nextset():
+                                break
+                stats[0] += batch
+                
+            except Exception:
+                stats[1] += 1
+                if stats[1] % 100 == 0:
+                    self.log_fail(f"Worker {worker_id}: {stats[1]} errors so far")
+            
+            # También tras un error: sin esto un servidor caído se reintenta
+            # en bucle cerrado
+            next_due += interval
+            slack = next_due - time.monotonic()
+            if slack > 0:
+                await asyncio.sleep(slack)
+    
+    def _warm_query_texts(self, conn, queries) -> list:
+        """
+        Ejecuta una vez cada query del pool para dejar los planes en la caché.
+        
+        Las queries se envían tal cual, con sus columnas: envolverlas en
+        COUNT_BIG permitiría al optimizador descartar trabajo que la carga
+        debe generar. Las filas se descartan en el cliente con fetchmany.
+        """
+        cursor = conn.cursor()
+        texts = []
+        for query in queries:
+            try:
+                cursor.execute(query)
+                self.discard_rows(cursor)
+            except Exception:
+                pass
+            # Un único objeto str por query para todos los workers
+            texts.append(sys.intern(query))
+        cursor.close()
+        return texts
+    
+    def _close_pool(self):
+        """Cierra todas las conexiones del pool."""
+        while True:
+            try:
+                self._pool.get_nowait().reset()
+            except queue.Empty:
+                break
+    
     def generate(
         self,
         intensity: str,
         duration_minutes: int,
         pattern: str = 'continuous',
-        threads: int = 4
+        threads: int = 4,
+        pool_size: Optional[int] = None,
+        runtime: str = 'threads'
     ) -> bool:
         """
         Genera workload.
@@ -259,6 +496,8 @@ class WorkloadGenerator:
             duration_minutes: Duración en minutos
             pattern: 'continuous' o 'peaks'
             threads: Número de threads concurrentes
+            pool_size: Conexiones compartidas por los threads (default: threads)
+            runtime: 'threads', 'asyncio' (aioodbc) o 'processes'
             
         Returns:
             True si completado exitosamente
@@ -295,48 +534,94 @@ class WorkloadGenerator:
             return False
         
         self.log_ok("Connection validated")
-        test_conn.close()
+        self._query_texts = self._warm_query_texts(test_conn, self._query_pool[intensity][0])
+        pool_size = min(threads, pool_size or threads)
         
-        # Iniciar threads
+        if runtime == 'asyncio' and aioodbc is None:
+            self.log_fail("aioodbc not installed, falling back to threads runtime")
+            runtime = 'threads'
+        
+        if runtime == 'threads':
+            # Pool compartido: la conexión de validación es la primera
+            self._pool = queue.Queue()
+            self._pool.put(PooledConnection(test_conn))
+            for _ in range(pool_size - 1):
+                self._pool.put(PooledConnection(self.connect()))
+            self.log_ok(f"Connection pool ready ({pool_size} connections)")
+        else:
+            test_conn.close()
+        
+        # Iniciar workers
         self.active = True
+        self._stop_event = multiprocessing.Event()
         workers = []
         
-        self.log_info(f"Starting {threads} worker threads...")
+        self.log_info(f"Starting {threads} workers ({runtime} runtime)...")
+        
+        if runtime == 'threads':
+            for i in range(threads):
+                t = threading.Thread(
+                    target=self.worker_thread,
+                    args=(i + 1, intensity, qpm_per_thread),
+                    daemon=True
+                )
+                t.start()
+                workers.append(t)
         
-        for i in range(threads):
+        elif runtime == 'asyncio':
+            # El event loop corre en su propio thread; el bucle de progreso
+            # de abajo no cambia
             t = threading.Thread(
-                target=self.worker_thread,
-                args=(i + 1, intensity, qpm_per_thread),
+                target=asyncio.run,
+                args=(self._async_main(threads, intensity, qpm_per_thread, pool_size),),
                 daemon=True
             )
             t.start()
             workers.append(t)
         
-        self.log_ok("All worker threads started")
+        else:  # processes
+            config = (self.server, self.database, self.username, self.password,
+                      self.trusted_connection)
+            for i in range(threads):
+                counters = multiprocessing.Array('q', 2, lock=False)
+                self._per_thread_stats[i + 1] = counters
+                p = multiprocessing.Process(
+                    target=_process_worker,
+                    args=(config, i + 1, intensity, qpm_per_thread,
+                          self._query_texts, counters, self._stop_event),
+                    daemon=True
+                )
+                p.start()
+                workers.append(p)
+        
+        self.log_ok("All workers started")
         print("")
         
         # Monitorear progreso
-        start_time = datetime.now()
-        end_time = start_time + timedelta(minutes=duration_minutes)
+        start_mono = time.monotonic()
+        deadline = start_mono + duration_minutes * 60
         
         try:
             last_queries = 0
-            last_time = time.time()
+            last_time = start_mono
             
-            while datetime.now() < end_time:
-                time.sleep(10)  # Reporte cada 10 segundos
+            # Reporte cada 10 segundos; wait() vuelve en cuanto se pide parar
+            while not self._stop_event.wait(min(10, max(deadline - time.monotonic(), 0))):
+                now = time.monotonic()
+                if now >= deadline:
+                    break
                 
-                elapsed = (datetime.now() - start_time).total_seconds()
-                remaining = (end_time - datetime.now()).total_seconds()
+                elapsed = now - start_mono
+                remaining = deadline - now
                 progress = (elapsed / (duration_minutes * 60)) * 100
                 
                 # Calcular velocidad actual
-                now = time.time()
-                queries_delta = self.queries_executed - last_queries
+                queries_executed = self.queries_executed
+                queries_delta = queries_executed - last_queries
                 time_delta = now - last_time
                 current_qps = queries_delta / time_delta if time_delta > 0 else 0
                 
-                last_queries = self.queries_executed
+                last_queries = queries_executed
                 last_time = now
                 
                 # Ajustar intensidad si es pattern 'peaks'
@@ -347,9 +632,9 @@ class WorkloadGenerator:
                         # Pico: aumentar carga temporalmente
                         pass  # Ya implementado en threads
                 
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] "
+                print(f"[{self._timestamp()[11:]}] "
                       f"Progress: {progress:.1f}% | "
-                      f"Queries: {self.queries_executed:,} | "
+                      f"Queries: {queries_executed:,} | "
                       f"QPS: {current_qps:.1f} | "
                       f"Errors: {self.errors} | "
                       f"Remaining: {int(remaining/60)}m {int(remaining%60)}s")
@@ -358,33 +643,68 @@ class WorkloadGenerator:
             print("")
             self.log_fail("Workload generation interrupted by user")
             self.active = False
+            self._stop_event.set()
             
             # Esperar threads
             for t in workers:
                 t.join(timeout=5)
             
+            self._close_pool()
             return False
         
         # Finalizar
         self.active = False
+        self._stop_event.set()
         
         self.log_info("Waiting for worker threads to finish...")
         for t in workers:
             t.join(timeout=10)
+        self._close_pool()
+        
+        queries_executed = self.queries_executed
+        errors = self.errors
         
         print("")
         self.log_ok("Workload generation completed")
         print("")
         print("Statistics:")
-        print(f"  Total Queries:     {self.queries_executed:,}")
-        print(f"  Total Errors:      {self.errors}")
-        print(f"  Success Rate:      {((self.queries_executed / (self.queries_executed + self.errors)) * 100) if (self.queries_executed + self.errors) > 0 else 0:.1f}%")
-        print(f"  Average QPS:       {self.queries_executed / (duration_minutes * 60):.1f}")
+        print(f"  Total Queries:     {queries_executed:,}")
+        print(f"  Total Errors:      {errors}")
+        print(f"  Success Rate:      {((queries_executed / (queries_executed + errors)) * 100) if (queries_executed + errors) > 0 else 0:.1f}%")
+        print(f"  Average QPS:       {queries_executed / (duration_minutes * 60):.1f}")
         print("")
         
         return True
 
 
+def _process_worker(config, worker_id, intensity, queries_per_minute, texts, counters, stop_event):
+    """
+    Worker del runtime 'processes': un generador propio con una conexión.
+    
+    Los contadores se comparten con el proceso principal vía
+    multiprocessing.Array; stop_event detiene el worker.
+    """
+    generator = WorkloadGenerator(*config)
+    generator._query_texts = texts
+    generator._per_thread_stats[worker_id] = counters
+    generator._stop_event = stop_event
+    generator._pool.put(PooledConnection(generator.connect()))
+    generator.active = True
+    
+    def wait_for_stop():
+        stop_event.wait()
+        generator.active = False
+    
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+    
+    try:
+        generator.worker_thread(worker_id, intensity, queries_per_minute)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        generator._close_pool()
+
+
 def main():
     """Función principal CLI."""
     parser = argparse.ArgumentParser(
@@ -418,6 +738,10 @@ Examples:
                        help='Duration in minutes (default: 60)')
     parser.add_argument('--threads', type=int, default=4,
                        help='Number of concurrent threads (default: 4)')
+    parser.add_argument('--pool-size', type=int, default=None,
+                       help='Connections shared by the threads (default: one per thread)')
+    parser.add_argument('--runtime', choices=['threads', 'asyncio', 'processes'], default='threads',
+                       help='Worker runtime (default: threads; asyncio requires aioodbc)')
     
     args = parser.parse_args()
     
@@ -438,7 +762,9 @@ Examples:
         intensity=args.intensity,
         duration_minutes=args.duration,
         pattern=args.pattern,
-        threads=args.threads
+        threads=args.threads,
+        pool_size=args.pool_size,
+        runtime=args.runtime
     )
     
     sys.exit(0 if success else 1)
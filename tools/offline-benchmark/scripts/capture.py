@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+SQL Server Workload Monitor - Output Capture Helpers
+=====================================================
+
+Captura por thread de la salida de los checks que el instalador y el
+diagnóstico ejecutan en paralelo, para imprimirla después en orden.
+"""
+
+import io
+import sys
+import threading
+
+
+_capture = threading.local()
+
+# sys.stdout se sustituye por un ThreadStdout solo mientras hay capturas
+_lock = threading.Lock()
+_active = 0
+_stdout = None
+
+
+class ThreadStdout:
+    """Envía la salida al buffer del thread actual si tiene uno, si no a stdout."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        return getattr(_capture, 'buffer', self._stream).write(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def run_captured(check_func, *check_args) -> tuple:
+    """
+    Ejecuta un check guardando su salida para imprimirla en orden.
+
+    Mientras haya capturas activas sys.stdout es un ThreadStdout: lo que
+    escribe este thread va a su buffer y lo de los demás sigue a stdout.
+    Al terminar la última captura se restaura el stdout original.
+
+    Returns:
+        Tupla (salida, resultado del check)
+    """
+    global _active, _stdout
+
+    with _lock:
+        if _active == 0:
+            _stdout = sys.stdout
+            sys.stdout = ThreadStdout(_stdout)
+        _active += 1
+
+    _capture.buffer = io.StringIO()
+    try:
+        result = check_func(*check_args)
+        return _capture.buffer.getvalue(), result
+    finally:
+        del _capture.buffer
+        with _lock:
+            _active -= 1
+            if _active == 0:
+                sys.stdout = _stdout
@@ -16,8 +16,50 @@ import sys
 import os
 import time
 import argparse
+import functools
+import io
+import mmap
+from collections import deque
 from datetime import datetime, timedelta
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+try:
+    # ijson elige por sí mismo el backend más rápido (yajl2_c si existe)
+    import ijson
+except ImportError:
+    ijson = None
+
+# A partir de este tamaño las muestras se procesan en streaming con ijson
+STREAM_THRESHOLD = 64 * 1024 * 1024
+
+# Muestras mostradas en "Recent Samples"
+RECENT_SAMPLES = 5
+
+BAR_70 = "=" * 70
+
+# Borrar pantalla y cursor al inicio (ANSI)
+CLEAR_SCREEN = "\x1b[2J\x1b[H"
+BANNER = f"\n{BAR_70}\n  SQL SERVER WORKLOAD MONITOR - STATUS CHECKER\n{BAR_70}\n\n"
+
 
 def format_duration(seconds: float) -> str:
     """Formatea duración en formato legible."""
@@ -39,48 +81,352 @@ def format_duration(seconds: float) -> str:
     return " ".join(parts)
 
 
-def analyze_checkpoint(checkpoint_file: str):
+@functools.lru_cache(maxsize=16)
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parsea un timestamp ISO; las muestras pico y recientes suelen repetirse.
+    
+    Los timestamps UTC (sufijo Z u offset) se devuelven en hora local aware;
+    los naive de versiones anteriores se devuelven tal cual.
+    """
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    dt = datetime.fromisoformat(value)
+    return dt.astimezone() if dt.tzinfo is not None else dt
+
+
+def load_checkpoint(checkpoint_file: str) -> dict:
+    """
+    Carga el checkpoint completo.
+    
+    Con orjson el fichero se mapea en memoria y se parsea sin copiarlo a un
+    buffer intermedio; sin orjson se lee como bytes para json.loads.
+    """
+    with open(checkpoint_file, 'rb') as f:
+        if orjson is not None:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # Fichero vacío o no mapeable: lectura normal
+                mm = None
+            
+            if mm is not None:
+                with mm, memoryview(mm) as view:
+                    return orjson.loads(view)
+        
+        data = f.read()
+    
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def stream_checkpoint(checkpoint_file: str) -> tuple:
+    """
+    Recorre un checkpoint grande sin cargar todas las muestras en memoria.
+    
+    Una primera pasada lee los campos escalares de cabecera (que preceden a
+    'samples'); la segunda pliega cada muestra en los acumuladores.
+    
+    Returns:
+        Tupla (cabecera, estadísticas de fold_samples)
+    """
+    header = {}
+    
+    with open(checkpoint_file, 'rb') as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if prefix == 'samples' and event == 'start_array':
+                if 'start_time' in header and 'checkpoint_time' in header:
+                    break
+            elif '.' not in prefix and event in ('string', 'number', 'boolean', 'null'):
+                header[prefix] = value
+        
+        f.seek(0)
+        stats = fold_samples(ijson.items(f, 'samples.item', use_float=True))
+    
+    return header, stats
+
+
+def iter_samples_file(samples_file: str, limit: int = None):
+    """
+    Itera las muestras de un NDJSON (una muestra por línea).
+    
+    Los .ndjson.zst se descomprimen al vuelo; su offset de checkpoint es
+    un fin de frame, así que se descomprime solo el tramo comprimido
+    anterior a él.
+    
+    Args:
+        samples_file: Path del archivo NDJSON (o .ndjson.zst)
+        limit: Byte offset del último checkpoint; lo escrito después se ignora
+    """
+    loads = orjson.loads if orjson is not None else json.loads
+    remaining = limit
+    
+    if samples_file.endswith('.zst'):
+        if zstd is None:
+            raise RuntimeError(f"zstandard is required to read {samples_file} (pip install zstandard)")
+        with open(samples_file, 'rb') as f:
+            data = f.read() if limit is None else f.read(limit)
+        f = io.BufferedReader(zstd.ZstdDecompressor().stream_reader(data, read_across_frames=True))
+        remaining = None
+    else:
+        f = open(samples_file, 'rb')
+    
+    with f:
+        for line in f:
+            if remaining is not None:
+                remaining -= len(line)
+                if remaining < 0:
+                    break
+            if line.strip():
+                yield loads(line)
+
+
+def summarize_samples_file(checkpoint_file: str, checkpoint: dict) -> dict:
+    """
+    Estadísticas de las muestras del NDJSON referenciado por el checkpoint.
+    
+    Returns:
+        Mismo dict que fold_samples
+    """
+    samples_file = os.path.join(
+        os.path.dirname(os.path.abspath(checkpoint_file)), checkpoint['samples_file'])
+    limit = checkpoint.get('samples_offset')
+    samples = iter_samples_file(samples_file, limit)
+    
+    # El offset de un .zst es tamaño comprimido: no sirve como cota de memoria
+    if limit is not None and limit <= STREAM_THRESHOLD and not samples_file.endswith('.zst'):
+        return summarize_samples(list(samples))
+    return fold_samples(samples)
+
+
+def fold_samples(samples) -> dict:
+    """
+    Calcula promedios, picos y últimas muestras en una sola pasada.
+    
+    Acepta cualquier iterable (lista o stream), así que la memoria usada no
+    depende del número de muestras.
+    
+    Returns:
+        Dict con count, avg_cpu, avg_mem, avg_batch, avg_conn, avg_reads,
+        avg_writes, los picos max_cpu, max_mem y max_conn con su timestamp
+        (max_cpu_ts, max_mem_ts, max_conn_ts) y recent (anillo de las
+        últimas RECENT_SAMPLES muestras, sin copiar)
+    """
+    count = 0
+    sum_cpu = sum_mem = sum_batch = sum_conn = sum_reads = sum_writes = 0
+    max_cpu_ms = max_mem = max_conn = None
+    max_cpu = max_cpu_ts = max_mem_ts = max_conn_ts = None
+    recent = deque(maxlen=RECENT_SAMPLES)
+    
+    for s in samples:
+        cpu = s['cpu']
+        memory = s['memory']
+        activity = s['activity']
+        io_section = s['io']
+        
+        cpu_ms = cpu['sql_server_cpu_time_ms']
+        mem = memory['buffer_pool_mb']
+        conn = activity['user_connections']
+        
+        count += 1
+        cpu_pct = cpu_ms / (cpu['total_cpus'] * 1000) * 100
+        sum_cpu += cpu_pct
+        sum_mem += mem
+        sum_batch += activity['batch_requests_per_sec']
+        sum_conn += conn
+        sum_reads += io_section['total_reads']
+        sum_writes += io_section['total_writes']
+        
+        if max_cpu_ms is None or cpu_ms > max_cpu_ms:
+            max_cpu_ms, max_cpu, max_cpu_ts = cpu_ms, cpu_pct, s['timestamp']
+        if max_mem is None or mem > max_mem:
+            max_mem, max_mem_ts = mem, s['timestamp']
+        if max_conn is None or conn > max_conn:
+            max_conn, max_conn_ts = conn, s['timestamp']
+        recent.append(s)
+    
+    if count == 0:
+        return {'count': 0}
+    
+    return {
+        'count': count,
+        'avg_cpu': sum_cpu / count,
+        'avg_mem': sum_mem / count,
+        'avg_batch': sum_batch / count,
+        'avg_conn': sum_conn / count,
+        'avg_reads': sum_reads / count,
+        'avg_writes': sum_writes / count,
+        'max_cpu': max_cpu,
+        'max_cpu_ts': max_cpu_ts,
+        'max_mem': max_mem,
+        'max_mem_ts': max_mem_ts,
+        'max_conn': max_conn,
+        'max_conn_ts': max_conn_ts,
+        'recent': recent,
+    }
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _reduce_samples(cpu_ms, ncpus, mem, batch, conn, reads, writes):
+        """Sumas e índices de pico de las métricas en un único bucle nativo."""
+        n = cpu_ms.shape[0]
+        sum_cpu = sum_mem = sum_batch = sum_conn = sum_reads = sum_writes = 0.0
+        max_cpu_idx = max_mem_idx = max_conn_idx = 0
+        
+        for i in range(n):
+            sum_cpu += cpu_ms[i] / (ncpus[i] * 1000.0) * 100.0
+            sum_mem += mem[i]
+            sum_batch += batch[i]
+            sum_conn += conn[i]
+            sum_reads += reads[i]
+            sum_writes += writes[i]
+            
+            if cpu_ms[i] > cpu_ms[max_cpu_idx]:
+                max_cpu_idx = i
+            if mem[i] > mem[max_mem_idx]:
+                max_mem_idx = i
+            if conn[i] > conn[max_conn_idx]:
+                max_conn_idx = i
+        
+        return (sum_cpu / n, sum_mem / n, sum_batch / n, sum_conn / n,
+                sum_reads / n, sum_writes / n, max_cpu_idx, max_mem_idx, max_conn_idx)
+else:
+    _reduce_samples = None
+
+
+class SampleColumns:
+    """
+    Muestras en formato columnar: un array float64 contiguo por métrica,
+    más la columna ts con los timestamps para situar los picos.
+    
+    El checkpoint guarda una lista de dicts anidados; se convierte una sola
+    vez para que las reducciones trabajen sobre memoria contigua.
+    """
+    
+    __slots__ = ('count', 'ts', 'cpu_ms', 'ncpus', 'mem', 'batch', 'conn', 'reads', 'writes')
+    
+    def __init__(self, samples: list):
+        count = self.count = len(samples)
+        
+        def column(section, key):
+            return np.fromiter((s[section][key] for s in samples), dtype=np.float64, count=count)
+        
+        self.ts = [s['timestamp'] for s in samples]
+        self.cpu_ms = column('cpu', 'sql_server_cpu_time_ms')
+        self.ncpus = column('cpu', 'total_cpus')
+        self.mem = column('memory', 'buffer_pool_mb')
+        self.batch = column('activity', 'batch_requests_per_sec')
+        self.conn = column('activity', 'user_connections')
+        self.reads = column('io', 'total_reads')
+        self.writes = column('io', 'total_writes')
+
+
+def summarize_samples(samples: list) -> dict:
+    """
+    Estadísticas de una lista de muestras ya cargada.
+    
+    Con numpy las muestras pasan a SampleColumns y se reducen en C (o en
+    un solo bucle compilado si numba está disponible); sin numpy se usa
+    fold_samples.
+    
+    Returns:
+        Mismo dict que fold_samples
+    """
+    if np is None or not samples:
+        return fold_samples(samples)
+    
+    cols = SampleColumns(samples)
+    
+    if _reduce_samples is not None:
+        (avg_cpu, avg_mem, avg_batch, avg_conn, avg_reads, avg_writes,
+         max_cpu_idx, max_mem_idx, max_conn_idx) = _reduce_samples(
+            cols.cpu_ms, cols.ncpus, cols.mem, cols.batch, cols.conn, cols.reads, cols.writes)
+    else:
+        avg_cpu = (cols.cpu_ms / (cols.ncpus * 1000) * 100).mean()
+        avg_mem, avg_batch, avg_conn = cols.mem.mean(), cols.batch.mean(), cols.conn.mean()
+        avg_reads, avg_writes = cols.reads.mean(), cols.writes.mean()
+        max_cpu_idx = cols.cpu_ms.argmax()
+        max_mem_idx = cols.mem.argmax()
+        max_conn_idx = cols.conn.argmax()
+    
+    return {
+        'count': cols.count,
+        'avg_cpu': float(avg_cpu),
+        'avg_mem': float(avg_mem),
+        'avg_batch': float(avg_batch),
+        'avg_conn': float(avg_conn),
+        'avg_reads': float(avg_reads),
+        'avg_writes': float(avg_writes),
+        'max_cpu': float(cols.cpu_ms[max_cpu_idx] / (cols.ncpus[max_cpu_idx] * 1000) * 100),
+        'max_cpu_ts': cols.ts[max_cpu_idx],
+        'max_mem': cols.mem[max_mem_idx].item(),
+        'max_mem_ts': cols.ts[max_mem_idx],
+        'max_conn': cols.conn[max_conn_idx].item(),
+        'max_conn_ts': cols.ts[max_conn_idx],
+        'recent': samples[-RECENT_SAMPLES:],
+    }
+
+
+def analyze_checkpoint(checkpoint_file: str, cache: dict = None):
     """
     Analiza archivo checkpoint y muestra estadísticas.
     
     Args:
         checkpoint_file: Path del archivo checkpoint
+        cache: Dict opcional que conserva checkpoint y estadísticas entre
+               llamadas; solo se vuelve a parsear si cambia el mtime/tamaño
     """
-    if not os.path.exists(checkpoint_file):
+    # Un único stat() para existencia, tamaño y fecha de modificación
+    try:
+        st = os.stat(checkpoint_file)
+    except FileNotFoundError:
         print(f"[FAIL] Checkpoint file not found: {checkpoint_file}")
         return False
     
     try:
-        # Cargar checkpoint
-        with open(checkpoint_file, 'r', encoding='utf-8') as f:
-            checkpoint = json.load(f)
+        # Cargar checkpoint: entero, o en streaming si es muy grande
+        file_size = st.st_size
+        signature = (st.st_mtime, file_size)
+        
+        if cache is not None and cache.get('signature') == signature:
+            checkpoint, stats = cache['checkpoint'], cache['stats']
+        else:
+            if ijson is not None and file_size > STREAM_THRESHOLD:
+                checkpoint, stats = stream_checkpoint(checkpoint_file)
+            else:
+                checkpoint = load_checkpoint(checkpoint_file)
+                if 'samples_file' in checkpoint:
+                    # Checkpoint ligero: las muestras están en el NDJSON
+                    stats = summarize_samples_file(checkpoint_file, checkpoint)
+                else:
+                    stats = summarize_samples(checkpoint.get('samples', []))
+            
+            if cache is not None:
+                cache.update(signature=signature, checkpoint=checkpoint, stats=stats)
         
         # Parsear timestamps
-        start_time = datetime.fromisoformat(checkpoint['start_time'])
-        checkpoint_time = datetime.fromisoformat(checkpoint['checkpoint_time'])
-        now = datetime.now()
+        start_time = parse_timestamp(checkpoint['start_time'])
+        checkpoint_time = parse_timestamp(checkpoint['checkpoint_time'])
+        now = datetime.now(checkpoint_time.tzinfo)
         
         # Calcular tiempos
         elapsed = (checkpoint_time - start_time).total_seconds()
         since_checkpoint = (now - checkpoint_time).total_seconds()
         
         # Estadísticas básicas
-        samples = checkpoint.get('samples', [])
-        samples_count = len(samples)
+        samples_count = stats['count']
         errors_count = checkpoint.get('errors_count', 0)
         
         # Banner
-        print("")
-        print("=" * 70)
-        print("  SQL SERVER WORKLOAD MONITOR - STATUS CHECKER")
-        print("=" * 70)
-        print("")
+        sys.stdout.write(BANNER)
         
         # Información general
         print("Checkpoint Information:")
         print(f"  File:            {checkpoint_file}")
-        print(f"  File Size:       {os.path.getsize(checkpoint_file):,} bytes")
-        print(f"  Modified:        {datetime.fromtimestamp(os.path.getmtime(checkpoint_file)).strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"  File Size:       {file_size:,} bytes")
+        print(f"  Modified:        {datetime.fromtimestamp(st.st_mtime).strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"  Version:         {checkpoint.get('version', 'Unknown')}")
         print("")
         
@@ -107,10 +453,10 @@ def analyze_checkpoint(checkpoint_file: str):
         print("")
         
         # Análisis de últimas muestras
-        if samples:
+        if samples_count:
             print("Recent Samples (last 5):")
-            for sample in samples[-5:]:
-                ts = datetime.fromisoformat(sample['timestamp']).strftime('%H:%M:%S')
+            for sample in stats['recent']:
+                ts = parse_timestamp(sample['timestamp']).strftime('%H:%M:%S')
                 cpu_pct = (sample['cpu']['sql_server_cpu_time_ms'] / (sample['cpu']['total_cpus'] * 1000)) * 100 if sample['cpu']['total_cpus'] > 0 else 0
                 mem_used = sample['memory']['buffer_pool_mb']
                 mem_total = sample['memory']['total_mb']
@@ -122,12 +468,12 @@ def analyze_checkpoint(checkpoint_file: str):
             # Métricas promedio
             print("Average Metrics (all samples):")
             
-            avg_cpu = sum((s['cpu']['sql_server_cpu_time_ms'] / (s['cpu']['total_cpus'] * 1000) * 100) for s in samples) / len(samples)
-            avg_mem = sum(s['memory']['buffer_pool_mb'] for s in samples) / len(samples)
-            avg_batch = sum(s['activity']['batch_requests_per_sec'] for s in samples) / len(samples)
-            avg_conn = sum(s['activity']['user_connections'] for s in samples) / len(samples)
-            avg_reads = sum(s['io']['total_reads'] for s in samples) / len(samples)
-            avg_writes = sum(s['io']['total_writes'] for s in samples) / len(samples)
+            avg_cpu = stats['avg_cpu']
+            avg_mem = stats['avg_mem']
+            avg_batch = stats['avg_batch']
+            avg_conn = stats['avg_conn']
+            avg_reads = stats['avg_reads']
+            avg_writes = stats['avg_writes']
             
             print(f"  CPU Usage:          {avg_cpu:.1f}%")
             print(f"  Buffer Pool Memory: {avg_mem:,.0f} MB")
@@ -140,21 +486,19 @@ def analyze_checkpoint(checkpoint_file: str):
             # Picos detectados
             print("Peak Values:")
             
-            max_cpu_sample = max(samples, key=lambda s: s['cpu']['sql_server_cpu_time_ms'])
-            max_cpu = (max_cpu_sample['cpu']['sql_server_cpu_time_ms'] / (max_cpu_sample['cpu']['total_cpus'] * 1000) * 100)
-            max_cpu_time = datetime.fromisoformat(max_cpu_sample['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+            # Solo se parsean los timestamps de las muestras pico (y una vez)
+            max_cpu = stats['max_cpu']
+            max_cpu_time = parse_timestamp(stats['max_cpu_ts']).strftime('%Y-%m-%d %H:%M:%S')
             
-            max_mem_sample = max(samples, key=lambda s: s['memory']['buffer_pool_mb'])
-            max_mem = max_mem_sample['memory']['buffer_pool_mb']
-            max_mem_time = datetime.fromisoformat(max_mem_sample['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+            max_mem = stats['max_mem']
+            max_mem_time = parse_timestamp(stats['max_mem_ts']).strftime('%Y-%m-%d %H:%M:%S')
             
-            max_conn_sample = max(samples, key=lambda s: s['activity']['user_connections'])
-            max_conn = max_conn_sample['activity']['user_connections']
-            max_conn_time = datetime.fromisoformat(max_conn_sample['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+            max_conn = stats['max_conn']
+            max_conn_time = parse_timestamp(stats['max_conn_ts']).strftime('%Y-%m-%d %H:%M:%S')
             
             print(f"  Peak CPU:         {max_cpu:.1f}% at {max_cpu_time}")
-            print(f"  Peak Memory:      {max_mem:,} MB at {max_mem_time}")
-            print(f"  Peak Connections: {max_conn} at {max_conn_time}")
+            print(f"  Peak Memory:      {max_mem:,.0f} MB at {max_mem_time}")
+            print(f"  Peak Connections: {max_conn:.0f} at {max_conn_time}")
             print("")
         
         # Status
@@ -164,9 +508,7 @@ def analyze_checkpoint(checkpoint_file: str):
         else:
             print("[OK] Monitoring appears to be running normally")
         
-        print("")
-        print("=" * 70)
-        print("")
+        sys.stdout.write(f"\n{BAR_70}\n\n")
         
         return True
         
@@ -187,17 +529,31 @@ def watch_checkpoint(checkpoint_file: str, interval: int = 30):
         checkpoint_file: Path del archivo checkpoint
         interval: Intervalo de refresco en segundos
     """
+    # Checkpoint parseado de la iteración anterior (se reutiliza si no cambió)
+    cache = {}
+    clear = sys.stdout.isatty()
+    
+    if clear and os.name == 'nt':
+        # Una llamada vacía activa las secuencias ANSI en la consola de Windows
+        os.system('')
+    
     try:
+        next_tick = time.monotonic()
+        
         while True:
-            # Limpiar pantalla
-            os.system('clear' if os.name == 'posix' else 'cls')
+            # Deadline fijo: el tiempo de análisis no desplaza el refresco
+            next_tick += interval
+            
+            # Limpiar pantalla sin lanzar un proceso por refresco
+            if clear:
+                sys.stdout.write(CLEAR_SCREEN)
             
             # Mostrar status
-            analyze_checkpoint(checkpoint_file)
+            analyze_checkpoint(checkpoint_file, cache)
             
-            # Esperar
+            # Esperar hasta el siguiente deadline (sin espera si ya pasó)
             print(f"Refreshing in {interval} seconds... (Ctrl+C to exit)")
-            time.sleep(interval)
+            time.sleep(max(0.0, next_tick - time.monotonic()))
             
     except KeyboardInterrupt:
         print("\n\n[OK] Exiting status checker")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+SQL Server Workload Monitor - Connection Helpers
+=================================================
+
+Construcción de la cadena de conexión ODBC compartida por el instalador,
+el generador de workload, el monitor y el diagnóstico.
+"""
+
+import functools
+import re
+from typing import Iterable, Optional
+
+
+DEFAULT_DRIVER = "ODBC Driver 17 for SQL Server"
+
+_DRIVER_RE = re.compile(r"^ODBC Driver (\d+) for SQL Server$")
+
+# Plantillas constantes: el método .format enlazado se reutiliza y solo
+# varían los campos de driver, servidor, base de datos y credenciales
+_TRUSTED_TMPL = ("DRIVER={{{driver}}};SERVER={server};"
+                 "DATABASE={db};Trusted_Connection=yes;").format
+_SQLAUTH_TMPL = ("DRIVER={{{driver}}};SERVER={server};"
+                 "DATABASE={db};UID={user};PWD={pw};").format
+_TIMEOUT_TMPL = "Connection Timeout={};".format
+_KEEPALIVE_TMPL = "KeepAlive={};".format
+
+
+def pick_driver(drivers: Iterable[str]) -> str:
+    """
+    Elige el "ODBC Driver NN for SQL Server" de versión más alta.
+
+    Args:
+        drivers: Nombres de drivers instalados (pyodbc.drivers())
+
+    Returns:
+        Nombre del driver, o DEFAULT_DRIVER si no hay ninguno reconocible
+    """
+    versions = [(int(m.group(1)), name)
+                for name in drivers
+                for m in (_DRIVER_RE.match(name),) if m]
+    return max(versions)[1] if versions else DEFAULT_DRIVER
+
+
+@functools.lru_cache(maxsize=8)
+def build_conn_str(
+    server: str,
+    db: str,
+    user: Optional[str],
+    pw: Optional[str],
+    trusted: bool,
+    timeout: Optional[int] = None,
+    driver: str = DEFAULT_DRIVER,
+    encrypt: bool = False,
+    keepalive: Optional[int] = None
+) -> str:
+    """
+    Construye (y cachea) la cadena de conexión ODBC.
+
+    Args:
+        server: Instancia SQL Server
+        db: Base de datos inicial
+        user: Usuario SQL (ignorado si trusted)
+        pw: Password SQL (ignorado si trusted)
+        trusted: Usar autenticación Windows
+        timeout: Connection Timeout en segundos (opcional)
+        driver: Driver ODBC (default: ODBC Driver 17 for SQL Server)
+        encrypt: Cifrar con TLS aceptando el certificado del servidor
+        keepalive: Intervalo de TCP keep-alive en segundos (opcional)
+
+    Returns:
+        Cadena de conexión terminada en ';'
+    """
+    if trusted:
+        conn_str = _TRUSTED_TMPL(driver=driver, server=server, db=db)
+    else:
+        conn_str = _SQLAUTH_TMPL(driver=driver, server=server, db=db, user=user, pw=pw)
+
+    if timeout:
+        conn_str += _TIMEOUT_TMPL(timeout)
+
+    if keepalive:
+        conn_str += _KEEPALIVE_TMPL(keepalive)
+
+    if encrypt:
+        # Driver 18 cifra por defecto y rechaza certificados autofirmados
+        conn_str += "Encrypt=yes;TrustServerCertificate=yes;"
+
+    # Permite varios result sets activos (batches con nextset)
+    return conn_str + "MARS_Connection=yes;"
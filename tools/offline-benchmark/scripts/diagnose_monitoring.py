@@ -15,8 +15,11 @@ import pyodbc
 import sys
 import os
 import argparse
+import functools
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from conn import build_conn_str
+from capture import run_captured
 
 
 class Colors:
@@ -29,54 +32,72 @@ class Colors:
     BOLD = '\033[1m'
 
 
+BAR_70 = "=" * 70
+
+_stamp_cache = [0, '']
+
+
 def supports_color():
     """Detecta si terminal soporta colores ANSI."""
     return hasattr(sys.stdout, 'isatty') and sys.stdout.isatty()
 
 
+# La terminal no cambia durante la ejecución: se decide una vez y se
+# precalculan los prefijos de cada nivel
+_COLOR = supports_color()
+
+if _COLOR:
+    _OK = f"{Colors.GREEN}[OK]{Colors.RESET}"
+    _FAIL = f"{Colors.RED}[FAIL]{Colors.RESET}"
+    _WARN = f"{Colors.YELLOW}[WARN]{Colors.RESET}"
+    _HEADER_BAR = f"{Colors.BOLD}{Colors.BLUE}{BAR_70}{Colors.RESET}"
+    _HEADER_TEXT = f"{Colors.BOLD}{Colors.BLUE}  {{}}{Colors.RESET}".format
+else:
+    _OK = "[OK]"
+    _FAIL = "[FAIL]"
+    _WARN = "[WARN]"
+    _HEADER_BAR = BAR_70
+    _HEADER_TEXT = "  {}".format
+
+
+def _timestamp() -> str:
+    """Hora HH:MM:SS de los mensajes, formateada como mucho una vez por segundo."""
+    tick = int(time.time())
+    if tick != _stamp_cache[0]:
+        _stamp_cache[0] = tick
+        _stamp_cache[1] = time.strftime("%H:%M:%S", time.localtime(tick))
+    return _stamp_cache[1]
+
+
 def print_header(text: str):
     """Imprime header con formato."""
-    if supports_color():
-        print(f"\n{Colors.BOLD}{Colors.BLUE}{'=' * 70}{Colors.RESET}")
-        print(f"{Colors.BOLD}{Colors.BLUE}  {text}{Colors.RESET}")
-        print(f"{Colors.BOLD}{Colors.BLUE}{'=' * 70}{Colors.RESET}\n")
-    else:
-        print(f"\n{'=' * 70}")
-        print(f"  {text}")
-        print(f"{'=' * 70}\n")
+    sys.stdout.write(f"\n{_HEADER_BAR}\n{_HEADER_TEXT(text)}\n{_HEADER_BAR}\n\n")
 
 
 def print_ok(message: str):
     """Imprime mensaje OK."""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    if supports_color():
-        print(f"[{timestamp}] {Colors.GREEN}[OK]{Colors.RESET} {message}")
-    else:
-        print(f"[{timestamp}] [OK] {message}")
+    sys.stdout.write(f"[{_timestamp()}] {_OK} {message}\n")
 
 
 def print_fail(message: str):
     """Imprime mensaje FAIL."""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    if supports_color():
-        print(f"[{timestamp}] {Colors.RED}[FAIL]{Colors.RESET} {message}")
-    else:
-        print(f"[{timestamp}] [FAIL] {message}")
+    sys.stdout.write(f"[{_timestamp()}] {_FAIL} {message}\n")
 
 
 def print_warning(message: str):
     """Imprime mensaje WARNING."""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    if supports_color():
-        print(f"[{timestamp}] {Colors.YELLOW}[WARN]{Colors.RESET} {message}")
-    else:
-        print(f"[{timestamp}] [WARN] {message}")
+    sys.stdout.write(f"[{_timestamp()}] {_WARN} {message}\n")
 
 
 def print_info(message: str):
     """Imprime mensaje INFO."""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    print(f"[{timestamp}] [INFO] {message}")
+    sys.stdout.write(f"[{_timestamp()}] [INFO] {message}\n")
+
+
+@functools.lru_cache(maxsize=1)
+def _odbc_drivers() -> tuple:
+    """Drivers ODBC instalados (registro / odbcinst.ini), leídos una sola vez."""
+    return tuple(pyodbc.drivers())
 
 
 def check_odbc_drivers():
@@ -84,7 +105,7 @@ def check_odbc_drivers():
     print_header("1. ODBC DRIVER CHECK")
     
     try:
-        drivers = pyodbc.drivers()
+        drivers = _odbc_drivers()
         
         if not drivers:
             print_fail("No ODBC drivers found")
@@ -94,20 +115,24 @@ def check_odbc_drivers():
         for driver in drivers:
             print(f"      - {driver}")
         
-        # Verificar driver recomendado
-        if 'ODBC Driver 17 for SQL Server' in drivers:
-            print_ok("ODBC Driver 17 for SQL Server is installed (recommended)")
-            return True
-        elif any('ODBC Driver' in d and 'SQL Server' in d for d in drivers):
-            other_driver = [d for d in drivers if 'ODBC Driver' in d and 'SQL Server' in d][0]
+        # Verificar driver recomendado (una sola pasada)
+        other_driver = None
+        for driver in drivers:
+            if driver == 'ODBC Driver 17 for SQL Server':
+                print_ok("ODBC Driver 17 for SQL Server is installed (recommended)")
+                return True
+            if other_driver is None and 'ODBC Driver' in driver and 'SQL Server' in driver:
+                other_driver = driver
+        
+        if other_driver is not None:
             print_warning(f"Using {other_driver} (Driver 17 recommended)")
             return True
-        else:
-            print_fail("No SQL Server ODBC driver found")
-            print_info("Install with:")
-            print_info("  Linux:   sudo apt install unixodbc-dev msodbcsql17")
-            print_info("  Windows: Download from Microsoft website")
-            return False
+        
+        print_fail("No SQL Server ODBC driver found")
+        print_info("Install with:")
+        print_info("  Linux:   sudo apt install unixodbc-dev msodbcsql17")
+        print_info("  Windows: Download from Microsoft website")
+        return False
             
     except Exception as e:
         print_fail(f"Error checking ODBC drivers: {e}")
@@ -115,7 +140,13 @@ def check_odbc_drivers():
 
 
 def check_connectivity(server: str, username: str = None, password: str = None):
-    """Verifica conectividad a SQL Server."""
+    """
+    Verifica conectividad a SQL Server.
+    
+    Returns:
+        Tupla (ok, conexión); la conexión queda abierta para los checks
+        siguientes y es None si falló
+    """
     print_header("2. SQL SERVER CONNECTIVITY CHECK")
     
     try:
@@ -130,23 +161,7 @@ def check_connectivity(server: str, username: str = None, password: str = None):
         print("")
         
         # Construir connection string
-        if trusted:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"Trusted_Connection=yes;"
-                f"Connection Timeout=10;"
-            )
-        else:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"UID={username};"
-                f"PWD={password};"
-                f"Connection Timeout=10;"
-            )
+        conn_str = build_conn_str(server, 'master', username, password, trusted, timeout=10)
         
         # Intentar conexión
         print_info("Attempting connection...")
@@ -181,9 +196,8 @@ def check_connectivity(server: str, username: str = None, password: str = None):
         print(f"      Full Version:   {row.Version.split(chr(10))[0][:80]}")
         
         cursor.close()
-        conn.close()
         
-        return True
+        return True, conn
         
     except pyodbc.Error as e:
         print_fail("Connection failed")
@@ -207,56 +221,34 @@ def check_connectivity(server: str, username: str = None, password: str = None):
             print("      - Install ODBC Driver 17 for SQL Server")
             print("      - Verify driver name in connection string")
         
-        return False
+        return False, None
         
     except Exception as e:
         print_fail(f"Unexpected error: {e}")
-        return False
+        return False, None
 
 
-def check_permissions(server: str, username: str = None, password: str = None):
-    """Verifica permisos necesarios."""
+def check_permissions(conn):
+    """Verifica permisos necesarios sobre la conexión abierta."""
     print_header("3. PERMISSIONS CHECK")
     
     try:
-        # Conectar
-        trusted = username is None
-        
-        if trusted:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"Trusted_Connection=yes;"
-            )
-        else:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"UID={username};"
-                f"PWD={password};"
-            )
-        
-        conn = pyodbc.connect(conn_str)
         cursor = conn.cursor()
         
-        # Verificar usuario actual
-        cursor.execute("SELECT SUSER_SNAME() AS CurrentUser, SYSTEM_USER AS SystemUser")
-        row = cursor.fetchone()
-        
-        print_info(f"Current User:   {row.CurrentUser}")
-        print_info(f"System User:    {row.SystemUser}")
-        print("")
-        
-        # Verificar permisos
+        # Usuario actual y permisos en una sola ida y vuelta
         cursor.execute("""
             SELECT 
+                SUSER_SNAME() AS CurrentUser,
+                SYSTEM_USER AS SystemUser,
                 HAS_PERMS_BY_NAME(NULL, NULL, 'VIEW SERVER STATE') AS HasViewServerState,
                 IS_SRVROLEMEMBER('sysadmin') AS IsSysAdmin
         """)
         row = cursor.fetchone()
         
+        print_info(f"Current User:   {row.CurrentUser}")
+        print_info(f"System User:    {row.SystemUser}")
+        print("")
+        
         has_permission = False
         
         if row.IsSysAdmin == 1:
@@ -271,14 +263,11 @@ def check_permissions(server: str, username: str = None, password: str = None):
         else:
             print_fail("User lacks VIEW SERVER STATE permission")
             print_info("Grant with:")
-            cursor.execute("SELECT SUSER_SNAME() AS CurrentUser")
-            user = cursor.fetchone().CurrentUser
-            print(f"      GRANT VIEW SERVER STATE TO [{user}]")
+            print(f"      GRANT VIEW SERVER STATE TO [{row.CurrentUser}]")
         
         print("")
         
         cursor.close()
-        conn.close()
         
         return has_permission
         
@@ -321,13 +310,18 @@ def check_query_file(query_file: str):
         return False
 
 
-def test_query_execution(
-    server: str,
-    query_file: str,
-    username: str = None,
-    password: str = None
-):
-    """Prueba ejecución de query."""
+# Columnas que monitor_sql_workload.py espera de la query
+EXPECTED_COLUMNS = (
+    'SampleTime', 'SampleTimeUtc', 'TotalCPUs', 'SQLServerCPUTimeMs',
+    'TotalMemoryMB', 'CommittedMemoryMB', 'TargetMemoryMB', 'BufferPoolMB',
+    'BatchRequestsPerSec', 'CompilationsPerSec', 'UserConnections',
+    'TotalReads', 'TotalWrites', 'TotalReadLatencyMs', 'TotalWriteLatencyMs',
+    'TotalBytesRead', 'TotalBytesWritten', 'TopWaitType', 'TopWaitTimeMs'
+)
+
+
+def test_query_execution(conn, query_file: str):
+    """Prueba ejecución de query sobre la conexión abierta."""
     print_header("5. QUERY EXECUTION TEST")
     
     try:
@@ -335,57 +329,31 @@ def test_query_execution(
         with open(query_file, 'r', encoding='utf-8') as f:
             query = f.read()
         
-        # Conectar
-        trusted = username is None
-        
-        if trusted:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"Trusted_Connection=yes;"
-            )
-        else:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={server};"
-                f"DATABASE=master;"
-                f"UID={username};"
-                f"PWD={password};"
-            )
-        
-        conn = pyodbc.connect(conn_str)
+        # pyodbc aplica el timeout de query por conexión (no por cursor)
+        conn.timeout = 30
         cursor = conn.cursor()
-        cursor.settimeout(30)
-        
+
         # Ejecutar query
         print_info("Executing query...")
         start = time.time()
-        cursor.execute(query)
-        row = cursor.fetchone()
+        row = cursor.execute(query).fetchone()
         duration = time.time() - start
         
         print_ok(f"Query executed successfully in {duration:.3f} seconds")
         print("")
         
-        # Validar columnas
-        expected_columns = [
-            'SampleTime', 'TotalCPUs', 'SQLServerCPUTimeMs', 
-            'TotalMemoryMB', 'CommittedMemoryMB', 'TargetMemoryMB', 'BufferPoolMB',
-            'BatchRequestsPerSec', 'CompilationsPerSec', 'UserConnections',
-            'TotalReads', 'TotalWrites', 'TotalReadLatencyMs', 'TotalWriteLatencyMs',
-            'TotalBytesRead', 'TotalBytesWritten', 'TopWaitType', 'TopWaitTimeMs'
-        ]
+        if row is None:
+            print_fail("Query returned no rows")
+            cursor.close()
+            return False
         
-        missing_columns = []
-        for col in expected_columns:
-            if not hasattr(row, col):
-                missing_columns.append(col)
+        # Validar columnas contra la descripción del resultado
+        actual_columns = {column[0] for column in cursor.description}
+        missing_columns = [col for col in EXPECTED_COLUMNS if col not in actual_columns]
         
         if missing_columns:
             print_fail(f"Query result missing expected columns: {', '.join(missing_columns)}")
             cursor.close()
-            conn.close()
             return False
         
         print_ok("All expected columns found")
@@ -415,7 +383,6 @@ def test_query_execution(
             print_ok("Query performance is good (< 2 seconds)")
         
         cursor.close()
-        conn.close()
         
         return True
         
@@ -487,28 +454,37 @@ Examples:
     args = parser.parse_args()
     
     # Banner
-    print("")
-    print("=" * 70)
-    print("  SQL SERVER WORKLOAD MONITOR - DIAGNOSTIC TOOL")
-    print("=" * 70)
+    sys.stdout.write(f"\n{BAR_70}\n  SQL SERVER WORKLOAD MONITOR - DIAGNOSTIC TOOL\n{BAR_70}\n")
     
     # Ejecutar checks
     checks = {}
     
-    checks['ODBC Drivers'] = check_odbc_drivers()
-    checks['SQL Server Connectivity'] = check_connectivity(args.server, args.username, args.password)
+    # Drivers y fichero de query se comprueban mientras se establece la
+    # conexión; cada sección se imprime después en su orden habitual
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        drivers_future = pool.submit(run_captured, check_odbc_drivers)
+        connectivity_future = pool.submit(run_captured, check_connectivity,
+                                          args.server, args.username, args.password)
+        query_file_future = pool.submit(run_captured, check_query_file, args.query_file)
+        
+        output, checks['ODBC Drivers'] = drivers_future.result()
+        sys.stdout.write(output)
+        output, (checks['SQL Server Connectivity'], conn) = connectivity_future.result()
+        sys.stdout.write(output)
+        query_file_output, query_file_ok = query_file_future.result()
     
-    if checks['SQL Server Connectivity']:
-        checks['User Permissions'] = check_permissions(args.server, args.username, args.password)
-        checks['Query File'] = check_query_file(args.query_file)
-        
-        if checks['Query File']:
-            checks['Query Execution'] = test_query_execution(
-                args.server,
-                args.query_file,
-                args.username,
-                args.password
-            )
+    # Una única conexión para todos los checks SQL
+    try:
+        if conn is not None:
+            checks['User Permissions'] = check_permissions(conn)
+            sys.stdout.write(query_file_output)
+            checks['Query File'] = query_file_ok
+            
+            if checks['Query File']:
+                checks['Query Execution'] = test_query_execution(conn, args.query_file)
+    finally:
+        if conn is not None:
+            conn.close()
     
     # Resumen
     success = print_summary(checks)
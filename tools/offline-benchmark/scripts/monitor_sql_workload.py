@@ -10,6 +10,7 @@ pero implementada en Python para máxima portabilidad.
 Características:
 - Query SQL externa (workload-sample-query.sql) para testing independiente
 - Checkpoints cada hora para recuperación de interrupciones
+- Muestras volcadas en streaming a NDJSON (memoria constante)
 - Detección automática de picos (peak hours)
 - Compatible con formato JSON del toolkit principal
 - Logging mejorado con tags [DEBUG], [OK], [FAIL]
@@ -33,17 +34,110 @@ Licencia: MIT
 """
 
 import pyodbc
+import asyncio
+import io
 import json
 import time
 import argparse
 import sys
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
 import traceback
+import operator
+import queue
+import signal
+import threading
+
+from conn import build_conn_str, pick_driver
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import aioodbc
+except ImportError:
+    aioodbc = None
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
 
 VERSION = "2.1.0"
 
+# Columnas de workload-sample-query.sql usadas en cada muestra (en orden)
+SAMPLE_COLUMNS = (
+    'SampleTimeUtc', 'TotalCPUs', 'SQLServerCPUTimeMs',
+    'TotalMemoryMB', 'CommittedMemoryMB', 'TargetMemoryMB', 'BufferPoolMB',
+    'BatchRequestsPerSec', 'CompilationsPerSec', 'UserConnections',
+    'TotalReads', 'TotalWrites', 'TotalReadLatencyMs', 'TotalWriteLatencyMs',
+    'TotalBytesRead', 'TotalBytesWritten', 'TopWaitType', 'TopWaitTimeMs'
+)
+
+# Claves planas de la muestra (mismo orden que SAMPLE_COLUMNS)
+SAMPLE_KEYS = (
+    'timestamp', 'total_cpus', 'sql_server_cpu_time_ms',
+    'total_mb', 'committed_mb', 'target_mb', 'buffer_pool_mb',
+    'batch_requests_per_sec', 'compilations_per_sec', 'user_connections',
+    'total_reads', 'total_writes', 'total_read_latency_ms', 'total_write_latency_ms',
+    'total_bytes_read', 'total_bytes_written', 'top_wait_type', 'top_wait_time_ms'
+)
+
+# Secciones del formato JSON anidado del toolkit
+SAMPLE_SECTIONS = (
+    ('cpu', SAMPLE_KEYS[1:3]),
+    ('memory', SAMPLE_KEYS[3:7]),
+    ('activity', SAMPLE_KEYS[7:10]),
+    ('io', SAMPLE_KEYS[10:16]),
+    ('waits', SAMPLE_KEYS[16:18])
+)
+
+# SQLSTATE que indican conexión perdida (se reintenta tras reconectar)
+CONNECTION_LOST_STATES = frozenset(('08S01', '08001', '08003'))
+
+# Reconexión: esperas 1s, 2s, 4s... con tope de 60s
+RECONNECT_ATTEMPTS = 5
+RECONNECT_MAX_DELAY = 60
+
+# Margen de asyncio.wait_for sobre el timeout del driver (solo respaldo)
+ASYNC_TIMEOUT_MARGIN = 10
+
+# Intervalo máximo (s) con temporizador del kernel (setitimer, solo POSIX);
+# por encima el jitter de time.sleep es irrelevante
+TIMER_MAX_INTERVAL = 5
+
+# Espera máxima (s) de cada sigtimedwait: acota lo que tarda en atenderse Ctrl+C
+TIMER_WAIT_SLICE = 0.5
+
+# Capacidad de la cola entre el muestreo y el hilo escritor
+WRITER_QUEUE_SIZE = 64
+
+# Lote de muestras en una sola ejecución: el servidor repite la query con
+# WAITFOR DELAY entre iteraciones y devuelve un result set por muestra
+BATCH_QUERY_TEMPLATE = """SET NOCOUNT ON;
+DECLARE @BatchSize INT = ?, @Delay VARCHAR(12) = ?, @i INT = 0;
+WHILE @i < @BatchSize
+BEGIN
+    IF @i > 0 WAITFOR DELAY @Delay;
+{query}
+    SET @i += 1;
+END"""
+
+# Línea de progreso por muestra (plantilla ya enlazada)
+PROGRESS_LINE = "[{:%H:%M:%S}] Sample #{}/{} ({:.1f}%) | Elapsed: {} | Remaining: {}".format
+
+# Las líneas de progreso pendientes se vuelcan al menos cada N segundos
+PROGRESS_FLUSH_SECONDS = 5
+
+# Flush del NDJSON de muestras cada N líneas
+SAMPLES_FLUSH_EVERY = 10
+
+# Nivel zstd del NDJSON de muestras (.ndjson.zst): rápido y ~10x
+SAMPLES_ZSTD_LEVEL = 1
+
 # Banner ASCII (sin emojis Unicode para compatibilidad)
 BANNER = """
 ====================================================================
@@ -53,6 +147,102 @@ BANNER = """
 """
 
 
+def utc_iso(dt: datetime) -> str:
+    """Timestamp ISO 8601 en UTC con sufijo Z (un datetime naive se asume UTC)."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat() + 'Z'
+
+
+def parse_utc(value: str) -> datetime:
+    """
+    Parsea un timestamp de checkpoint a datetime UTC aware.
+    
+    Acepta el sufijo Z (fromisoformat no lo admite antes de Python 3.11) y
+    timestamps naive de versiones anteriores, que estaban en hora local.
+    """
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value).astimezone(timezone.utc)
+
+
+def dump_json(obj: Any, pretty: bool = False) -> bytes:
+    """
+    Serializa a JSON en bytes: compacto por defecto, indent=2 con pretty.
+    Usa orjson si está instalado.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _indent(block: bytes, prefix: bytes) -> bytes:
+    """Indenta todas las líneas de un bloque JSON salvo la primera."""
+    return block.replace(b'\n', b'\n' + prefix)
+
+
+def compact_sql(text: str) -> str:
+    """
+    Quita líneas en blanco y comentarios de línea completa (--) de la query,
+    que si no viajarían al servidor en cada ejecución.
+    
+    Supone que ningún literal de texto abarca varias líneas.
+    """
+    return "\n".join(
+        line.rstrip()
+        for line in text.splitlines()
+        if line.strip() and not line.lstrip().startswith('--')
+    )
+
+
+def open_samples_reader(samples_file: str):
+    """
+    Abre el NDJSON de muestras para leerlo línea a línea, descomprimiendo
+    al vuelo si es .zst (un frame zstd por checkpoint).
+    """
+    fp = open(samples_file, 'rb')
+    if not samples_file.endswith('.zst'):
+        return fp
+    return io.BufferedReader(zstd.ZstdDecompressor().stream_reader(fp, read_across_frames=True))
+
+
+def format_hms(seconds: int) -> str:
+    """Formatea segundos enteros como H:MM:SS."""
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def _to_nested(flat: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte una muestra plana al formato anidado del JSON de salida."""
+    sample = {'timestamp': flat['timestamp']}
+    for section, keys in SAMPLE_SECTIONS:
+        sample[section] = {key: flat[key] for key in keys}
+    return sample
+
+
+class SamplingPlan:
+    """Parámetros y estado del bucle de muestreo (compartido sync/async)."""
+    
+    __slots__ = ('total_samples', 'interval_seconds', 'batch_size', 'start_time',
+                 'checkpoint_file', 'checkpoint_interval_minutes', 'progress_every',
+                 'start_mono', 'next_checkpoint')
+    
+    def __init__(self, total_samples, interval_seconds, batch_size, start_time,
+                 checkpoint_file, checkpoint_interval_minutes, progress_every):
+        self.total_samples = total_samples
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.start_time = start_time
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_interval_minutes = checkpoint_interval_minutes
+        self.progress_every = progress_every
+        self.start_mono = None
+        self.next_checkpoint = None
+
+
 class SQLServerMonitor:
     """
     Monitor SQL Server workload con capacidades offline/standalone.
@@ -85,34 +275,77 @@ class SQLServerMonitor:
         self.password = password
         self.trusted_connection = trusted_connection
         self.query_file = query_file
+        self.driver = None
         self.conn = None
+        self._aconn = None
+        self._acursor = None
+        self._cursor = None
+        self._row_values = None
         self.sql_query = None
+        self.query_timeout = 30
+        self.pretty = False
+        
+        # Líneas de progreso pendientes de escribir en stdout
+        self._progress = []
+        self._progress_flushed = 0.0
+        self._batch_query = None
+        self._batch_delay = None
+        self.samples_fp = None
+        self._samples_raw = None
+        self.samples_file = None
+        
+        # Hilo escritor: serializa y escribe fuera del bucle de muestreo
+        self._queue = None
+        self._writer = None
+        self._writer_error = None
+        
+        # Temporizador periódico SIGALRM (intervalos cortos en POSIX)
+        self._timer_active = False
         
         # Statistics
         self.samples_collected = 0
+        self.samples_written = 0
         self.errors_count = 0
         self.last_checkpoint_time = None
         
+    def _log(self, tag: str, message: str):
+        """Escribe una línea de log con timestamp y tag."""
+        print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] [{tag}] {message}", flush=True)
+    
     def log_info(self, message: str):
         """Log informational message."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] [INFO] {message}", flush=True)
+        self._log("INFO", message)
     
     def log_debug(self, message: str):
         """Log debug message."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] [DEBUG] {message}", flush=True)
+        self._log("DEBUG", message)
     
     def log_ok(self, message: str):
         """Log success message."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] [OK] {message}", flush=True)
+        self._log("OK", message)
     
     def log_fail(self, message: str):
         """Log failure message."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp}] [FAIL] {message}", flush=True)
+        self._log("FAIL", message)
         
+    def add_progress(self, line: str, every: int):
+        """
+        Acumula una línea de progreso y las vuelca juntas cada `every` líneas
+        o cada PROGRESS_FLUSH_SECONDS segundos.
+        """
+        self._progress.append(line)
+        if len(self._progress) >= every or time.monotonic() - self._progress_flushed >= PROGRESS_FLUSH_SECONDS:
+            self.flush_progress()
+    
+    def flush_progress(self):
+        """Escribe las líneas de progreso pendientes con un único write."""
+        if self._progress:
+            self._progress.append("")
+            sys.stdout.write("\n".join(self._progress))
+            sys.stdout.flush()
+            self._progress.clear()
+        self._progress_flushed = time.monotonic()
+    
     def load_query(self) -> bool:
         """
         Carga query SQL desde archivo externo.
@@ -126,16 +359,32 @@ class SQLServerMonitor:
                 self.log_fail(f"Query file not found: {self.query_file}")
                 return False
             
-            with open(self.query_file, 'r', encoding='utf-8') as f:
-                self.sql_query = f.read()
+            # Se lee y decodifica una sola vez; se ejecuta la versión compacta
+            with open(self.query_file, 'rb') as f:
+                text = f.read().decode('utf-8-sig')
+            
+            self.sql_query = compact_sql(text)
             
             self.log_ok(f"Loaded query from: {self.query_file}")
+            self.log_debug(f"Query text: {len(self.sql_query):,} of {len(text):,} chars sent per execution")
             return True
             
         except Exception as e:
             self.log_fail(f"Failed to load query file: {e}")
             return False
     
+    def _conn_str(self) -> str:
+        """Cadena de conexión del monitor (driver elegido una sola vez)."""
+        if self.driver is None:
+            self.driver = pick_driver(pyodbc.drivers())
+            self.log_debug(f"Using driver: {self.driver}")
+        
+        return build_conn_str(
+            self.server, self.database, self.username, self.password,
+            self.trusted_connection, timeout=10, driver=self.driver,
+            encrypt=True, keepalive=30
+        )
+    
     def connect(self) -> bool:
         """
         Establece conexión a SQL Server.
@@ -147,27 +396,11 @@ class SQLServerMonitor:
         try:
             self.log_debug(f"Attempting connection to: {self.server}")
             
-            if self.trusted_connection:
-                # Windows Authentication
-                conn_str = (
-                    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                    f"SERVER={self.server};"
-                    f"DATABASE={self.database};"
-                    f"Trusted_Connection=yes;"
-                    f"Connection Timeout=10;"
-                )
-            else:
-                # SQL Authentication
-                conn_str = (
-                    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                    f"SERVER={self.server};"
-                    f"DATABASE={self.database};"
-                    f"UID={self.username};"
-                    f"PWD={self.password};"
-                    f"Connection Timeout=10;"
-                )
-            
-            self.conn = pyodbc.connect(conn_str)
+            conn_str = self._conn_str()
+            
+            # autocommit: solo lecturas de DMVs, sin transacciones abiertas
+            # que puedan quedar colgadas al reconectar
+            self.conn = pyodbc.connect(conn_str, autocommit=True)
             
             # Test query
             cursor = self.conn.cursor()
@@ -179,6 +412,14 @@ class SQLServerMonitor:
             self.log_debug(f"Version: {row.Version.split(chr(10))[0][:80]}")
             
             cursor.close()
+            
+            # Timeout de las queries de muestreo (30s, más la espera de un
+            # lote), configurado una sola vez; pyodbc lo aplica a cada
+            # sentencia de la conexión
+            self.conn.timeout = self.query_timeout
+            
+            # Cursor de larga vida para collect_batch
+            self._cursor = self.conn.cursor()
             return True
             
         except Exception as e:
@@ -188,6 +429,13 @@ class SQLServerMonitor:
     
     def disconnect(self):
         """Cierra conexión a SQL Server."""
+        if self._cursor:
+            try:
+                self._cursor.close()
+            except Exception as e:
+                self.log_debug(f"Error closing cursor: {e}")
+            self._cursor = None
+        
         if self.conn:
             try:
                 self.conn.close()
@@ -195,6 +443,28 @@ class SQLServerMonitor:
             except Exception as e:
                 self.log_debug(f"Error closing connection: {e}")
     
+    def reconnect(self) -> bool:
+        """
+        Restablece la conexión con backoff exponencial.
+        
+        Returns:
+            True si se reconectó, False tras RECONNECT_ATTEMPTS intentos
+        """
+        self.disconnect()
+        delay = 1
+        
+        for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+            self.log_info(f"Reconnecting in {delay}s (attempt {attempt}/{RECONNECT_ATTEMPTS})...")
+            time.sleep(delay)
+            
+            if self.connect():
+                self.log_ok("Reconnected to SQL Server")
+                return True
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        
+        self.log_fail("Could not reconnect to SQL Server")
+        return False
+    
     def check_permissions(self) -> bool:
         """
         Verifica permisos necesarios para monitorización.
@@ -229,6 +499,27 @@ class SQLServerMonitor:
             self.log_fail(f"Could not check permissions: {e}")
             return False
     
+    def _bind_columns(self, description) -> bool:
+        """
+        Resuelve una sola vez la posición de SAMPLE_COLUMNS en el resultado.
+        
+        Args:
+            description: cursor.description de la query de muestreo
+            
+        Returns:
+            True si están todas las columnas, False en caso contrario
+        """
+        index = {d[0]: i for i, d in enumerate(description)}
+        missing = [c for c in SAMPLE_COLUMNS if c not in index]
+        
+        if missing:
+            self.log_fail(f"Query result missing expected columns: {', '.join(missing)}")
+            return False
+        
+        # Un itemgetter extrae todas las columnas en una sola llamada en C
+        self._row_values = operator.itemgetter(*(index[c] for c in SAMPLE_COLUMNS))
+        return True
+    
     def test_query(self) -> bool:
         """
         Prueba ejecución de query antes de monitorización completa.
@@ -253,9 +544,8 @@ class SQLServerMonitor:
             self.log_ok("Query executed successfully")
             self.log_info(f"Execution time: {duration:.3f} seconds")
             
-            # Validar columnas esperadas
-            if not hasattr(row, 'TotalCPUs'):
-                self.log_fail("Query result missing expected columns")
+            # Validar columnas esperadas (y guardar sus índices)
+            if not self._bind_columns(cursor.description):
                 cursor.close()
                 return False
             
@@ -277,74 +567,407 @@ class SQLServerMonitor:
             self.log_debug(f"Stack trace: {traceback.format_exc()}")
             return False
     
-    def collect_sample(self) -> Optional[Dict[str, Any]]:
+    def set_batch_size(self, batch_size: int, interval_seconds: int):
         """
-        Recolecta una muestra de métricas.
-        Implementa timeout de 30s para evitar hangs.
+        Configura la recolección por lotes de batch_size muestras.
+        
+        Args:
+            batch_size: Muestras por ejecución (1 = una query por muestra)
+            interval_seconds: Intervalo entre muestras dentro del lote
+        """
+        if batch_size > 1:
+            self._batch_query = BATCH_QUERY_TEMPLATE.format(query=self.sql_query)
+            self._batch_delay = "{:02d}:{:02d}:{:02d}".format(
+                interval_seconds // 3600, interval_seconds // 60 % 60, interval_seconds % 60)
+            self.query_timeout = 30 + (batch_size - 1) * interval_seconds
+    
+    def _fetch_rows(self, batch_size: int) -> tuple:
+        """
+        Ejecuta la query (o el lote) y devuelve (filas, description): una
+        fila por muestra y la descripción del primer result set, ya que
+        tras el último nextset() la del cursor es None.
+        """
+        if batch_size == 1:
+            cursor = self._cursor.execute(self.sql_query)
+            return [cursor.fetchone()], cursor.description
+        
+        cursor = self._cursor.execute(self._batch_query, batch_size, self._batch_delay)
+        description = cursor.description
+        rows = [cursor.fetchone()]
+        while cursor.nextset():
+            rows.append(cursor.fetchone())
+        return rows, description
+    
+    def _rows_to_samples(self, rows: list, description) -> List[Dict[str, Any]]:
+        """Convierte filas de la query en muestras planas (claves SAMPLE_KEYS)."""
+        # Índices de columnas (si test_query no se ejecutó)
+        if self._row_values is None and not self._bind_columns(description):
+            self.errors_count += 1
+            return []
+        
+        samples = []
+        for row in rows:
+            # Muestra plana; el anidado se construye al escribirla
+            sample = dict(zip(SAMPLE_KEYS, self._row_values(row)))
+            sample['timestamp'] = utc_iso(sample['timestamp'])
+            samples.append(sample)
+        
+        self.samples_collected += len(samples)
+        return samples
+    
+    def collect_batch(self, batch_size: int = 1) -> List[Dict[str, Any]]:
+        """
+        Recolecta batch_size muestras de métricas en una sola ejecución.
+        Implementa timeout de 30s (más la duración del lote) para evitar hangs.
+        
+        Reutiliza el cursor creado en connect() en lugar de abrir uno por
+        muestra. Si la conexión se ha perdido, reconecta y reintenta una vez;
+        si una reconexión anterior se agotó, vuelve a intentarla antes de la
+        query.
+        
+        Args:
+            batch_size: Número de muestras (requiere set_batch_size si > 1)
         
         Returns:
-            Dict con métricas o None si error
+            Lista de dicts planos (claves SAMPLE_KEYS); vacía si error
         """
+        # Sin cursor: los reintentos de una pérdida anterior fallaron
+        if self._cursor is None and not self.reconnect():
+            self.errors_count += 1
+            return []
+        
         try:
-            cursor = self.conn.cursor()
-            cursor.settimeout(30)  # Timeout de 30 segundos
+            try:
+                rows, description = self._fetch_rows(batch_size)
+            except (pyodbc.InterfaceError, pyodbc.OperationalError) as e:
+                if not e.args or e.args[0] not in CONNECTION_LOST_STATES:
+                    raise
+                self.log_fail(f"Connection lost: {e}")
+                if not self.reconnect():
+                    raise
+                rows, description = self._fetch_rows(batch_size)
             
-            cursor.execute(self.sql_query)
-            row = cursor.fetchone()
+            return self._rows_to_samples(rows, description)
             
-            # Construir dict con métricas
-            sample = {
-                'timestamp': row.SampleTime.isoformat(),
-                'cpu': {
-                    'total_cpus': row.TotalCPUs,
-                    'sql_server_cpu_time_ms': row.SQLServerCPUTimeMs
-                },
-                'memory': {
-                    'total_mb': row.TotalMemoryMB,
-                    'committed_mb': row.CommittedMemoryMB,
-                    'target_mb': row.TargetMemoryMB,
-                    'buffer_pool_mb': row.BufferPoolMB
-                },
-                'activity': {
-                    'batch_requests_per_sec': row.BatchRequestsPerSec,
-                    'compilations_per_sec': row.CompilationsPerSec,
-                    'user_connections': row.UserConnections
-                },
-                'io': {
-                    'total_reads': row.TotalReads,
-                    'total_writes': row.TotalWrites,
-                    'total_read_latency_ms': row.TotalReadLatencyMs,
-                    'total_write_latency_ms': row.TotalWriteLatencyMs,
-                    'total_bytes_read': row.TotalBytesRead,
-                    'total_bytes_written': row.TotalBytesWritten
-                },
-                'waits': {
-                    'top_wait_type': row.TopWaitType,
-                    'top_wait_time_ms': row.TopWaitTimeMs
-                }
-            }
+        except pyodbc.OperationalError as e:
+            if 'timeout' in str(e).lower():
+                self.log_fail(f"Query timeout (> {self.query_timeout} seconds)")
+            else:
+                self.log_fail(f"Query error: {e}")
+            self.errors_count += 1
+            return []
             
-            cursor.close()
-            self.samples_collected += 1
-            return sample
+        except Exception as e:
+            self.log_fail(f"Failed to collect sample: {e}")
+            self.log_debug(f"Stack: {traceback.format_exc()}")
+            self.errors_count += 1
+            return []
+    
+    async def _apply_query_timeout(self, raw_conn):
+        """Timeout de query en la conexión pyodbc subyacente (after_created)."""
+        raw_conn.timeout = self.query_timeout
+    
+    async def aconnect(self) -> bool:
+        """Abre la conexión aioodbc usada por el bucle asíncrono."""
+        try:
+            # El driver cancela la sentencia al vencer el timeout, como en
+            # connect(); el timeout de aioodbc es solo el de login
+            self._aconn = await aioodbc.connect(dsn=self._conn_str(), autocommit=True,
+                                                after_created=self._apply_query_timeout)
+            self._acursor = await self._aconn.cursor()
+            return True
+        except Exception as e:
+            self.log_fail(f"Could not connect to SQL Server (async): {e}")
+            return False
+    
+    async def adisconnect(self):
+        """Cierra cursor y conexión aioodbc."""
+        try:
+            if self._acursor is not None:
+                await self._acursor.close()
+            if self._aconn is not None:
+                await self._aconn.close()
+        except Exception as e:
+            self.log_debug(f"Error closing async connection: {e}")
+        self._aconn = self._acursor = None
+    
+    async def areconnect(self) -> bool:
+        """Equivalente asíncrono de reconnect() (mismo backoff)."""
+        await self.adisconnect()
+        delay = 1
+        
+        for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+            self.log_info(f"Reconnecting in {delay}s (attempt {attempt}/{RECONNECT_ATTEMPTS})...")
+            await asyncio.sleep(delay)
+            
+            if await self.aconnect():
+                self.log_ok("Reconnected to SQL Server")
+                return True
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        
+        self.log_fail("Could not reconnect to SQL Server")
+        return False
+    
+    async def _fetch_rows_async(self, batch_size: int) -> tuple:
+        """Equivalente asíncrono de _fetch_rows()."""
+        cursor = self._acursor
+        if batch_size == 1:
+            await cursor.execute(self.sql_query)
+            return [await cursor.fetchone()], cursor.description
+        
+        await cursor.execute(self._batch_query, batch_size, self._batch_delay)
+        description = cursor.description
+        rows = [await cursor.fetchone()]
+        while await cursor.nextset():
+            rows.append(await cursor.fetchone())
+        return rows, description
+    
+    async def collect_batch_async(self, batch_size: int = 1) -> List[Dict[str, Any]]:
+        """
+        Equivalente asíncrono de collect_batch() sobre aioodbc.
+        
+        El driver cancela la query al vencer query_timeout; asyncio.wait_for
+        queda como respaldo y, si salta, se reabre la conexión.
+        
+        Returns:
+            Lista de dicts planos (claves SAMPLE_KEYS); vacía si error
+        """
+        # Sin cursor: los reintentos de una pérdida anterior fallaron
+        if self._acursor is None and not await self.areconnect():
+            self.errors_count += 1
+            return []
+        
+        backstop = self.query_timeout + ASYNC_TIMEOUT_MARGIN
+        
+        try:
+            try:
+                rows, description = await asyncio.wait_for(self._fetch_rows_async(batch_size), backstop)
+            except (pyodbc.InterfaceError, pyodbc.OperationalError) as e:
+                if not e.args or e.args[0] not in CONNECTION_LOST_STATES:
+                    raise
+                self.log_fail(f"Connection lost: {e}")
+                if not await self.areconnect():
+                    raise
+                rows, description = await asyncio.wait_for(self._fetch_rows_async(batch_size), backstop)
+            
+            return self._rows_to_samples(rows, description)
+            
+        except asyncio.TimeoutError:
+            self.log_fail(f"Query timeout (> {self.query_timeout} seconds)")
+            self.errors_count += 1
+            await self.areconnect()
+            return []
             
         except pyodbc.OperationalError as e:
             if 'timeout' in str(e).lower():
-                self.log_fail("Query timeout (> 30 seconds)")
+                self.log_fail(f"Query timeout (> {self.query_timeout} seconds)")
             else:
                 self.log_fail(f"Query error: {e}")
             self.errors_count += 1
-            return None
+            return []
             
         except Exception as e:
             self.log_fail(f"Failed to collect sample: {e}")
             self.log_debug(f"Stack: {traceback.format_exc()}")
             self.errors_count += 1
-            return None
+            return []
+    
+    def open_samples_file(
+        self,
+        samples_file: str,
+        offset: Optional[int] = None,
+        legacy_samples: Optional[List[Dict]] = None
+    ):
+        """
+        Abre el NDJSON de muestras (una muestra JSON por línea).
+        
+        Args:
+            samples_file: Path del archivo NDJSON (.zst = comprimido con zstd)
+            offset: Byte offset del último checkpoint (resume); None = nuevo
+            legacy_samples: Muestras de un checkpoint antiguo a migrar
+        """
+        if offset is None:
+            fp = open(samples_file, 'wb')
+        else:
+            # Descartar lo escrito después del último checkpoint (en .zst el
+            # offset es un fin de frame, así que los frames nuevos se añaden)
+            fp = open(samples_file, 'r+b')
+            fp.truncate(offset)
+            fp.seek(offset)
+        
+        self._samples_raw = fp
+        if samples_file.endswith('.zst'):
+            self.samples_fp = zstd.ZstdCompressor(level=SAMPLES_ZSTD_LEVEL).stream_writer(fp)
+        else:
+            self.samples_fp = fp
+        self.samples_file = samples_file
+        
+        for sample in legacy_samples or ():
+            self._write_record(sample)
+    
+    def write_sample(self, sample: Dict[str, Any]):
+        """Añade una muestra plana de collect_batch() al NDJSON."""
+        self._write_record(_to_nested(sample))
+    
+    def _write_record(self, record: Dict[str, Any]):
+        """Escribe una muestra anidada como línea JSON compacta."""
+        self.samples_fp.write(dump_json(record) + b'\n')
+        self.samples_written += 1
+        
+        if self.samples_written % SAMPLES_FLUSH_EVERY == 0:
+            self.samples_fp.flush()
+    
+    def end_samples_frame(self):
+        """
+        Vuelca el NDJSON al sistema operativo. En .zst cierra el frame
+        actual, de modo que lo escrito hasta aquí se puede descomprimir.
+        """
+        if self.samples_fp is self._samples_raw:
+            self.samples_fp.flush()
+        else:
+            self.samples_fp.flush(zstd.FLUSH_FRAME)
+    
+    def close_samples_file(self):
+        """Cierra el NDJSON de muestras."""
+        if self.samples_fp is not None:
+            # En .zst cierra también el archivo subyacente
+            self.samples_fp.close()
+            self.samples_fp = self._samples_raw = None
+    
+    def start_writer(self):
+        """Arranca el hilo que escribe muestras y checkpoints en disco."""
+        self._queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self._writer_error = None
+        self._writer = threading.Thread(target=self._writer_loop, name="sample-writer", daemon=True)
+        self._writer.start()
+    
+    def _writer_loop(self):
+        """Ejecuta las tareas (función, *args) encoladas hasta recibir None."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            
+            func, *args = item
+            try:
+                func(*args)
+            except Exception as e:
+                self.log_fail(f"Writer thread error: {e}")
+                self._writer_error = e
+    
+    def enqueue(self, func, *args):
+        """
+        Encola una tarea de escritura sin bloquear el muestreo.
+        
+        Solo espera si el disco va más de WRITER_QUEUE_SIZE tareas por detrás.
+        """
+        if self._writer_error is not None:
+            raise self._writer_error
+        
+        item = (func,) + args
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.log_debug("Writer queue full, waiting for disk")
+            self._queue.put(item)
+    
+    def stop_writer(self):
+        """Vacía la cola y detiene el hilo escritor."""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+    
+    def start_interval_timer(self, period: float) -> bool:
+        """
+        Arranca un temporizador periódico del kernel (SIGALRM) que marca
+        cada slot de muestreo con menos jitter que time.sleep.
+        
+        SIGALRM queda bloqueada y se consume con sigwait(): sin handler no
+        hay carreras ni syscalls interrumpidas en el driver ODBC. Debe
+        llamarse antes de arrancar otros hilos, que heredan la máscara.
+        
+        Args:
+            period: Periodo en segundos
+            
+        Returns:
+            True si está activo; False si no hay setitimer (Windows) o no se
+            está en el hilo principal
+        """
+        if not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+            return False
+        
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+        signal.setitimer(signal.ITIMER_REAL, period, period)
+        self._timer_active = True
+        return True
+    
+    def wait_interval_timer(self):
+        """
+        Espera al siguiente tick (inmediato si ya hay uno pendiente).
+        
+        sigwait() no vuelve hasta el tick aunque llegue SIGINT; en tramos de
+        TIMER_WAIT_SLICE el KeyboardInterrupt salta entre esperas.
+        """
+        while signal.sigtimedwait({signal.SIGALRM}, TIMER_WAIT_SLICE) is None:
+            pass
+    
+    def stop_interval_timer(self):
+        """Detiene el temporizador y desbloquea SIGALRM sin tick pendiente."""
+        if self._timer_active:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            if signal.SIGALRM in signal.sigpending():
+                signal.sigwait({signal.SIGALRM})
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGALRM})
+            self._timer_active = False
+    
+    def save_results(self, output_file: str, metadata: Dict[str, Any]):
+        """
+        Genera el JSON final {metadata, samples} copiando el NDJSON línea a
+        línea, sin cargar las muestras en memoria.
+        
+        Compacto por defecto; con --pretty cada muestra se re-serializa con
+        indent=2 (mismo resultado que json.dump(result, indent=2)).
+        
+        Args:
+            output_file: Archivo JSON de salida
+            metadata: Bloque metadata del resultado
+        """
+        self.end_samples_frame()
+        pretty = self.pretty
+        loads = orjson.loads if orjson is not None else json.loads
+        
+        with open_samples_reader(self.samples_file) as src, open(output_file, 'wb') as dst:
+            if pretty:
+                dst.write(b'{\n  "metadata": ')
+                dst.write(_indent(dump_json(metadata, True), b'  '))
+                dst.write(b',\n  "samples": [')
+                separator = b'\n    '
+            else:
+                dst.write(b'{"metadata":')
+                dst.write(dump_json(metadata))
+                dst.write(b',"samples":[')
+                separator = b''
+            
+            written = False
+            for line in src:
+                line = line.rstrip(b'\r\n')
+                if not line:
+                    continue
+                if pretty:
+                    line = _indent(dump_json(loads(line), True), b'    ')
+                dst.write(separator)
+                dst.write(line)
+                separator = b',\n    ' if pretty else b','
+                written = True
+            
+            if pretty:
+                dst.write(b'\n  ]\n}' if written else b']\n}')
+            else:
+                dst.write(b']}')
     
     def save_checkpoint(
         self,
-        samples: List[Dict],
         start_time: datetime,
         checkpoint_file: str
     ):
@@ -352,27 +975,44 @@ class SQLServerMonitor:
         Guarda checkpoint para recuperación.
         Mejora del proyecto funcional: checkpoints cada hora.
         
+        Las muestras ya están en el NDJSON: el checkpoint solo hace fsync
+        del NDJSON y guarda contadores y el byte offset hasta el que es
+        válido (en .zst, el fin del frame recién cerrado). El archivo de
+        contadores se reemplaza de forma atómica.
+        
         Args:
-            samples: Lista de muestras recolectadas
             start_time: Tiempo de inicio del monitoreo
             checkpoint_file: Path del archivo checkpoint
         """
         try:
+            self.end_samples_frame()
+            os.fsync(self._samples_raw.fileno())
+            
             checkpoint = {
                 'version': VERSION,
                 'server': self.server,
-                'start_time': start_time.isoformat(),
-                'checkpoint_time': datetime.now().isoformat(),
-                'samples_collected': len(samples),
+                'database': self.database,
+                'start_time': utc_iso(start_time),
+                'checkpoint_time': utc_iso(datetime.now(timezone.utc)),
+                'samples_collected': self.samples_written,
                 'errors_count': self.errors_count,
-                'samples': samples
+                # Relativo al directorio del checkpoint
+                'samples_file': os.path.relpath(
+                    os.path.abspath(self.samples_file),
+                    os.path.dirname(os.path.abspath(checkpoint_file))
+                ),
+                'samples_offset': self._samples_raw.tell()
             }
             
-            with open(checkpoint_file, 'w', encoding='utf-8') as f:
-                json.dump(checkpoint, f, indent=2)
+            tmp_file = checkpoint_file + '.tmp'
+            with open(tmp_file, 'wb') as f:
+                f.write(dump_json(checkpoint, self.pretty))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, checkpoint_file)
             
             self.log_debug(f"Checkpoint saved: {checkpoint_file}")
-            self.last_checkpoint_time = datetime.now()
+            self.last_checkpoint_time = datetime.now(timezone.utc)
             
         except Exception as e:
             self.log_fail(f"Failed to save checkpoint: {e}")
@@ -400,13 +1040,117 @@ class SQLServerMonitor:
             self.log_fail(f"Failed to load checkpoint: {e}")
             return None
     
+    def _start_plan(self, plan: SamplingPlan, now_mono: float):
+        """Fija los orígenes de tiempo del plan al empezar a muestrear."""
+        now = datetime.now(timezone.utc)
+        plan.next_checkpoint = now + timedelta(minutes=plan.checkpoint_interval_minutes)
+        
+        # Origen monotónico del tiempo transcurrido (incluye lo ya resumido)
+        plan.start_mono = now_mono - (now - plan.start_time).total_seconds()
+    
+    def _record_batch(self, plan: SamplingPlan, samples: list, i: int, count: int, deadline: float):
+        """Encola las muestras, muestra el progreso y decide el checkpoint."""
+        now = datetime.now(timezone.utc)
+        total_samples = plan.total_samples
+        
+        for sample in samples:
+            self.enqueue(self.write_sample, sample)
+        
+        if samples:
+            # Progress (segundos enteros, sin timedelta)
+            mono = time.monotonic()
+            progress = ((i + count) / total_samples) * 100
+            elapsed_s = int(mono - plan.start_mono)
+            remaining_s = max(0, int(deadline + (total_samples - 1 - i) * plan.interval_seconds - mono))
+            
+            self.add_progress(PROGRESS_LINE(now.astimezone(), i + count, total_samples, progress,
+                                            format_hms(elapsed_s), format_hms(remaining_s)),
+                              plan.progress_every)
+        
+        # Checkpoint?
+        if now >= plan.next_checkpoint:
+            self.enqueue(self.save_checkpoint, plan.start_time, plan.checkpoint_file)
+            plan.next_checkpoint = now + timedelta(minutes=plan.checkpoint_interval_minutes)
+    
+    def run_sampling(self, plan: SamplingPlan, start_sample: int):
+        """
+        Bucle de muestreo síncrono.
+        
+        Args:
+            plan: Parámetros del muestreo
+            start_sample: Primera muestra (mayor que 0 al resumir)
+        """
+        # Deadline monotónico por muestra: el tiempo de la query no se acumula
+        deadline = time.monotonic()
+        self._start_plan(plan, deadline)
+        
+        i = start_sample
+        while i < plan.total_samples:
+            # Recolectar muestra (o lote de muestras)
+            count = min(plan.batch_size, plan.total_samples - i)
+            samples = self.collect_batch(count)
+            self._record_batch(plan, samples, i, count, deadline)
+            i += count
+            
+            # Esperar hasta el siguiente deadline (excepto en última muestra);
+            # un lote ya ha esperado en el servidor entre sus muestras
+            if i < plan.total_samples:
+                deadline += count * plan.interval_seconds
+                if self._timer_active:
+                    self.wait_interval_timer()
+                    continue
+                
+                sleep_for = deadline - time.monotonic()
+                if sleep_for > 0:
+                    time.sleep(sleep_for)
+                else:
+                    self.log_debug(f"Sampling behind by {-sleep_for:.1f}s")
+    
+    async def run_sampling_async(self, plan: SamplingPlan, start_sample: int):
+        """
+        Bucle de muestreo asíncrono (aioodbc): la espera entre muestras es
+        un asyncio.sleep y la escritura sigue en el hilo escritor.
+        
+        Args:
+            plan: Parámetros del muestreo
+            start_sample: Primera muestra (mayor que 0 al resumir)
+        """
+        if not await self.aconnect():
+            raise ConnectionError("Async connection failed")
+        
+        try:
+            deadline = time.monotonic()
+            self._start_plan(plan, deadline)
+            
+            i = start_sample
+            while i < plan.total_samples:
+                count = min(plan.batch_size, plan.total_samples - i)
+                samples = await self.collect_batch_async(count)
+                self._record_batch(plan, samples, i, count, deadline)
+                i += count
+                
+                if i < plan.total_samples:
+                    deadline += count * plan.interval_seconds
+                    sleep_for = deadline - time.monotonic()
+                    if sleep_for > 0:
+                        await asyncio.sleep(sleep_for)
+                    else:
+                        self.log_debug(f"Sampling behind by {-sleep_for:.1f}s")
+        finally:
+            await self.adisconnect()
+    
     def monitor(
         self,
         duration_minutes: int,
         interval_seconds: int,
         output_file: str,
         checkpoint_interval_minutes: int = 60,
-        resume_from: Optional[str] = None
+        resume_from: Optional[str] = None,
+        batch_size: int = 1,
+        pretty: bool = False,
+        progress_every: int = 10,
+        use_async: bool = False,
+        compress: bool = True
     ) -> bool:
         """
         Ejecuta monitorización completa.
@@ -417,6 +1161,11 @@ class SQLServerMonitor:
             output_file: Archivo JSON de salida
             checkpoint_interval_minutes: Intervalo de checkpoints (default: 60)
             resume_from: Archivo checkpoint para resumir (opcional)
+            batch_size: Muestras por ejecución de la query (default: 1)
+            pretty: JSON indentado (indent=2) en salida y checkpoints
+            progress_every: Líneas de progreso por escritura en stdout
+            use_async: Muestrear con aioodbc/asyncio (requiere aioodbc)
+            compress: Comprimir el NDJSON intermedio con zstd (si está instalado)
             
         Returns:
             True si completado exitosamente, False en caso contrario
@@ -426,8 +1175,11 @@ class SQLServerMonitor:
         
         # Configuración
         total_samples = (duration_minutes * 60) // interval_seconds
-        end_time = datetime.now() + timedelta(minutes=duration_minutes)
+        end_time = datetime.now(timezone.utc) + timedelta(minutes=duration_minutes)
         checkpoint_file = output_file.replace('.json', '_checkpoint.json')
+        samples_file = output_file + '.ndjson'
+        if compress and zstd is not None:
+            samples_file += '.zst'
         
         print("Configuration:")
         print(f"  Server:           {self.server}")
@@ -435,107 +1187,148 @@ class SQLServerMonitor:
         print(f"  Sample Interval:  {interval_seconds} seconds")
         print(f"  Total Samples:    {total_samples}")
         print(f"  Checkpoint Every: {checkpoint_interval_minutes} minutes")
+        if batch_size > 1:
+            print(f"  Batch Size:       {batch_size} samples per query")
         print(f"  Output File:      {output_file}")
         print("")
         
+        if use_async and aioodbc is None:
+            self.log_fail("--async requires aioodbc (pip install aioodbc)")
+            return False
+        
+        if compress and zstd is None:
+            self.log_info("zstandard not installed, samples file will not be compressed")
+        
         # Cargar query externa
         if not self.load_query():
             return False
         
+        self.set_batch_size(batch_size, interval_seconds)
+        self.pretty = pretty
+        
         # Conectar
         if not self.connect():
             return False
         
-        # Verificar permisos
-        if not self.check_permissions():
-            self.log_fail("Insufficient permissions. Exiting.")
-            return False
-        
-        # Test query
-        if not self.test_query():
-            self.log_fail("Query test failed. Exiting.")
-            return False
-        
-        print("")
-        print("Timeline:")
-        print(f"  Start:     {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"  Estimated: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
-        print("")
-        
         # Inicializar o resumir
-        samples = []
         start_sample = 0
-        start_time = datetime.now()
+        start_time = datetime.now(timezone.utc)
+        samples_offset = None
+        legacy_samples = None
+        checkpoint = None
         
         if resume_from and os.path.exists(resume_from):
             checkpoint = self.load_checkpoint(resume_from)
             if checkpoint:
-                samples = checkpoint['samples']
                 start_sample = checkpoint['samples_collected']
-                start_time = datetime.fromisoformat(checkpoint['start_time'])
+                start_time = parse_utc(checkpoint['start_time'])
                 self.samples_collected = start_sample
                 self.errors_count = checkpoint.get('errors_count', 0)
+                
+                if 'samples_file' in checkpoint:
+                    samples_file = os.path.join(
+                        os.path.dirname(os.path.abspath(resume_from)),
+                        checkpoint['samples_file']
+                    )
+                    samples_offset = checkpoint['samples_offset']
+                    self.samples_written = start_sample
+                else:
+                    # Checkpoint de versiones anteriores con lista de muestras
+                    legacy_samples = checkpoint.pop('samples')
+        
+        # Un checkpoint válido de esta versión y servidor ya pasó las
+        # comprobaciones previas: no repetir queries a las DMVs
+        if (checkpoint and checkpoint.get('version') == VERSION
+                and checkpoint.get('server') == self.server):
+            self.log_ok("Skipping pre-flight checks (resume mode)")
+        else:
+            # Verificar permisos
+            if not self.check_permissions():
+                self.log_fail("Insufficient permissions. Exiting.")
+                return False
+            
+            # Test query
+            if not self.test_query():
+                self.log_fail("Query test failed. Exiting.")
+                return False
+        
+        print("")
+        print("Timeline:")
+        print(f"  Start:     {datetime.now():%Y-%m-%d %H:%M:%S}")
+        print(f"  Estimated: {end_time.astimezone():%Y-%m-%d %H:%M:%S}")
+        print("")
+        
+        if samples_file.endswith('.zst') and zstd is None:
+            self.log_fail(f"Resuming {samples_file} requires zstandard (pip install zstandard)")
+            self.disconnect()
+            return False
+        
+        try:
+            self.open_samples_file(samples_file, samples_offset, legacy_samples)
+        except OSError as e:
+            self.log_fail(f"Could not open samples file {samples_file}: {e}")
+            self.disconnect()
+            return False
+        
+        # Las muestras ya están en el NDJSON: no retener la lista del
+        # checkpoint durante toda la ejecución
+        checkpoint = legacy_samples = None
+        
+        # Intervalos cortos: slots marcados por el kernel en lugar de sleep
+        # (antes de arrancar el hilo escritor para que herede la máscara)
+        if (not use_async and interval_seconds <= TIMER_MAX_INTERVAL
+                and self.start_interval_timer(batch_size * interval_seconds)):
+            self.log_debug("Using SIGALRM interval timer")
+        
+        self.start_writer()
         
         self.log_ok("Starting monitoring...")
         print("")
         
         # Loop de monitorización
-        next_checkpoint = datetime.now() + timedelta(minutes=checkpoint_interval_minutes)
+        plan = SamplingPlan(total_samples, interval_seconds, batch_size, start_time,
+                            checkpoint_file, checkpoint_interval_minutes, progress_every)
         
         try:
-            for i in range(start_sample, total_samples):
-                # Recolectar muestra
-                sample = self.collect_sample()
-                
-                if sample:
-                    samples.append(sample)
-                    
-                    # Progress
-                    progress = ((i + 1) / total_samples) * 100
-                    elapsed = datetime.now() - start_time
-                    remaining = end_time - datetime.now()
-                    
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] "
-                          f"Sample #{i+1}/{total_samples} ({progress:.1f}%) | "
-                          f"Elapsed: {str(elapsed).split('.')[0]} | "
-                          f"Remaining: {str(remaining).split('.')[0]}")
-                
-                # Checkpoint?
-                if datetime.now() >= next_checkpoint:
-                    self.save_checkpoint(samples, start_time, checkpoint_file)
-                    next_checkpoint = datetime.now() + timedelta(minutes=checkpoint_interval_minutes)
-                
-                # Esperar intervalo (excepto en última muestra)
-                if i < total_samples - 1:
-                    time.sleep(interval_seconds)
+            if use_async:
+                # El bucle asíncrono usa su propia conexión aioodbc
+                self.disconnect()
+                asyncio.run(self.run_sampling_async(plan, start_sample))
+            else:
+                self.run_sampling(plan, start_sample)
+            
+            # Esperar a que el hilo escritor vacíe la cola
+            self.flush_progress()
+            self.stop_interval_timer()
+            self.stop_writer()
+            if self._writer_error is not None:
+                raise self._writer_error
             
             # Guardar resultado final
             self.log_ok("Monitoring completed successfully")
-            self.log_info(f"Total samples collected: {len(samples)}")
+            self.log_info(f"Total samples collected: {self.samples_written}")
             self.log_info(f"Total errors: {self.errors_count}")
             
-            # Guardar JSON final
-            result = {
-                'metadata': {
-                    'version': VERSION,
-                    'server': self.server,
-                    'database': self.database,
-                    'start_time': start_time.isoformat(),
-                    'end_time': datetime.now().isoformat(),
-                    'duration_minutes': duration_minutes,
-                    'interval_seconds': interval_seconds,
-                    'total_samples': len(samples),
-                    'errors_count': self.errors_count
-                },
-                'samples': samples
+            # Guardar JSON final (formato esperado por import_offline_benchmark.sh)
+            metadata = {
+                'version': VERSION,
+                'server': self.server,
+                'database': self.database,
+                'start_time': utc_iso(start_time),
+                'end_time': utc_iso(datetime.now(timezone.utc)),
+                'duration_minutes': duration_minutes,
+                'interval_seconds': interval_seconds,
+                'total_samples': self.samples_written,
+                'errors_count': self.errors_count
             }
             
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2)
+            self.save_results(output_file, metadata)
             
             self.log_ok(f"Results saved to: {output_file}")
             
-            # Limpiar checkpoint
+            # Limpiar checkpoint y NDJSON intermedio
+            self.close_samples_file()
+            os.remove(samples_file)
             if os.path.exists(checkpoint_file):
                 os.remove(checkpoint_file)
                 self.log_debug("Checkpoint file removed")
@@ -543,24 +1336,28 @@ class SQLServerMonitor:
             return True
             
         except KeyboardInterrupt:
+            self.flush_progress()
             print("")
             self.log_fail("Monitoring interrupted by user (Ctrl+C)")
             self.log_info("Saving partial results...")
             
-            # Guardar checkpoint parcial
-            self.save_checkpoint(samples, start_time, checkpoint_file)
+            # Guardar checkpoint parcial (tras escribir lo encolado)
+            self.stop_writer()
+            self.save_checkpoint(start_time, checkpoint_file)
             self.log_ok(f"Partial checkpoint saved: {checkpoint_file}")
             self.log_info(f"Resume with: --resume-from {checkpoint_file}")
             
             return False
             
         except Exception as e:
+            self.flush_progress()
             self.log_fail(f"Monitoring failed: {e}")
             self.log_debug(f"Stack: {traceback.format_exc()}")
             
             # Intentar guardar checkpoint
             try:
-                self.save_checkpoint(samples, start_time, checkpoint_file)
+                self.stop_writer()
+                self.save_checkpoint(start_time, checkpoint_file)
                 self.log_info(f"Emergency checkpoint saved: {checkpoint_file}")
             except:
                 pass
@@ -568,6 +1365,9 @@ class SQLServerMonitor:
             return False
             
         finally:
+            self.stop_interval_timer()
+            self.stop_writer()
+            self.close_samples_file()
             self.disconnect()
 
 
@@ -602,6 +1402,16 @@ Examples:
     parser.add_argument('--query-file', default='workload-sample-query.sql', help='SQL query file')
     parser.add_argument('--checkpoint-interval', type=int, default=60, help='Checkpoint interval in minutes (default: 60)')
     parser.add_argument('--resume-from', help='Resume from checkpoint file')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Samples collected per query execution (default: 1)')
+    parser.add_argument('--progress-every', type=int, default=10,
+                        help='Progress lines buffered per stdout write (default: 10)')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Sample with aioodbc/asyncio instead of blocking pyodbc calls')
+    parser.add_argument('--no-compress', dest='compress', action='store_false',
+                        help='Write the intermediate samples file as plain NDJSON instead of zstd (debugging)')
+    parser.add_argument('--pretty', action='store_true',
+                        help='Write indented JSON output and checkpoints (default: compact)')
     parser.add_argument('--version', action='version', version=f'%(prog)s {VERSION}')
     
     args = parser.parse_args()
@@ -625,7 +1435,12 @@ Examples:
         interval_seconds=args.interval,
         output_file=args.output,
         checkpoint_interval_minutes=args.checkpoint_interval,
-        resume_from=args.resume_from
+        resume_from=args.resume_from,
+        batch_size=max(1, args.batch_size),
+        pretty=args.pretty,
+        progress_every=max(1, args.progress_every),
+        use_async=args.use_async,
+        compress=args.compress
     )
     
     sys.exit(0 if success else 1)
@@ -40,6 +40,7 @@
 SELECT 
     -- Timestamp
     GETDATE() AS SampleTime,
+    SYSUTCDATETIME() AS SampleTimeUtc,
     
     -- CPU Metrics
     si.cpu_count AS TotalCPUs,